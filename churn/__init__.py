@@ -0,0 +1 @@
+# Shared code behind the Data Sayens churn dashboards
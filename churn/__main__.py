@@ -0,0 +1,331 @@
+# Command line entry point: python -m churn <command>
+import os
+import sys
+import json
+import time
+import argparse
+
+
+def evaluate_command(args):
+    from churn import data, evaluation, registry
+
+    entry = registry.get_model_entry(args.model)
+    decdf = data.load_excel_cached(args.dataset)
+    output = args.output or evaluation.report_path(entry.path)
+    report = evaluation.build_report(entry.model, decdf, entry.sha256, data.source_version(args.dataset), output)
+    for split in ('train', 'test'):
+        metrics = ", ".join(f"{name} {value:.4f}" for name, value in report[split].items())
+        print(f"{split}: {metrics}")
+    print(f"Report written to {output}")
+
+
+def export_forest_command(args):
+    import tempfile
+    from churn import compact, data, evaluation, registry
+
+    entry = registry.get_model_entry(args.model)
+    option = compact.ExportOption(args.n_trees, args.max_depth, args.compact)
+    if args.report or args.max_loss is not None:
+        _, X_test, _, y_test = evaluation.split_dataset(data.load_excel_cached(args.dataset))
+        with tempfile.TemporaryDirectory() as workdir:
+            rows = compact.tradeoffs(entry.model, entry.path, X_test, y_test,
+                                     compact.export_options(entry.model), workdir)
+        print(f"{'option':<34} {'file KB':>8} {'load ms':>8} {'accuracy':>9} {'roc_auc':>8} "
+              f"{'acc loss':>9} {'auc loss':>9} {'max diff':>9}")
+        for row in rows:
+            print(f"{row['option']:<34} {row['size_bytes'] / 1024:>8.0f} {row['load_ms']:>8.2f} "
+                  f"{row['accuracy']:>9.4f} {row['roc_auc']:>8.4f} {row['accuracy_loss']:>9.4f} "
+                  f"{row['roc_auc_loss']:>9.4f} {row['max_score_diff']:>9.2g}")
+        if args.max_loss is not None:
+            chosen = compact.choose(rows, args.max_loss, args.metric)
+            if chosen is None:
+                print(f"No export loses at most {args.max_loss} {args.metric}", file=sys.stderr)
+                return 1
+            option = chosen['export']
+
+    forest = option.export(entry.model)
+    forest.save(args.output, source_sha256=entry.sha256, n_trees=forest.n_trees,
+                max_depth=forest.depth, compact=option.compact)
+    print(f"{option.describe(entry.model)}: {len(forest.feature):,} nodes, "
+          f"{os.path.getsize(args.output) / 2**20:.2f} MB written to {args.output}")
+
+
+def score_command(args):
+    import numpy as np
+    from churn import registry, scoring, streaming
+    from churn.encoding import MissingColumnsError
+
+    # Check the paths before spending time on loading the model
+    try:
+        streaming.file_kind(args.input)
+        streaming.output_kind(args.output)
+    except ValueError as e:
+        sys.exit(str(e))
+    if not os.path.isfile(args.input):
+        sys.exit(f"{args.input}: no such file")
+    if not os.path.isdir(os.path.dirname(os.path.abspath(args.output))):
+        sys.exit(f"{args.output}: the output directory does not exist")
+
+    start = time.perf_counter()
+    entry = registry.get_model_entry(args.model)
+    workers = args.workers or scoring.default_workers()
+    chunks = streaming.iter_chunks(args.input, chunk_size=args.chunk_size)
+    writer = streaming.open_writer(args.output)
+    try:
+        result = streaming.score_stream(entry.model, streaming.prefetch(chunks), writer, workers=workers,
+                                        model_sha256=entry.sha256)
+    except MissingColumnsError as e:
+        sys.exit(f"{args.input}: missing columns {e}")
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"{result.rows:,} rows scored with {os.path.basename(entry.path)} on {workers} threads, "
+          f"{result.invalid_rows:,} invalid, written to {args.output}")
+    cache = scoring.prediction_cache.stats()
+    print(f"{result.unique_rows:,} distinct feature vectors, {result.dedup_ratio:.1f} rows per vector; "
+          f"{cache['misses']:,} predicted, {cache['hits']:,} from the prediction cache")
+    print(f"total {elapsed:.2f} s, {result.rows / elapsed:,.0f} rows/sec "
+          f"(model load {entry.load_seconds:.2f} s, read {result.read_seconds:.2f} s, "
+          f"score {result.score_seconds:.2f} s, write {result.write_seconds:.2f} s)")
+    if result.chunk_timings:
+        seconds = np.array([chunk_seconds for _, chunk_seconds in result.chunk_timings])
+        per_row = np.array([chunk_seconds / max(rows, 1) for rows, chunk_seconds in result.chunk_timings]) * 1e6
+        p50, p95, p99 = np.percentile(seconds * 1000, [50, 95, 99])
+        print(f"chunk latency over {len(seconds)} chunks: p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms, "
+              f"max {seconds.max() * 1000:.1f} ms, {np.median(per_row):.1f} us/row")
+    if result.invalid_rows:
+        print(result.error_frame.head(20).to_string(index=False), file=sys.stderr)
+        if args.strict:
+            return 1
+    return 0
+
+
+def import_budget_command(args):
+    from churn import startup
+
+    failed = False
+    for script, seconds, heavy, ok in startup.check_budget(args.scripts or startup.DASHBOARDS, args.budget, args.repeats):
+        status = "ok" if ok else "FAIL"
+        print(f"{status:4} {os.path.basename(script)}: {seconds:.2f} s of {args.budget:.2f} s"
+              + (f", imports {', '.join(heavy)}" if heavy else ""))
+        failed |= not ok
+    return 1 if failed else 0
+
+
+def share_command(args):
+    from churn import data, registry, shared
+    from churn.forest import FlatForest
+
+    if not args.directory:
+        sys.exit("Set CHURN_SHARED_DIR or pass --directory, e.g. /dev/shm/churn")
+    shared.SHARED_DIR = args.directory
+    decdf = data.load_excel_cached(args.dataset)
+    entry = registry.get_model_entry(args.model)
+    print(f"{len(decdf):,} rows of {os.path.basename(args.dataset)} and {os.path.basename(entry.path)} "
+          f"({type(entry.model).__name__}) shared from {args.directory}:")
+    for name in sorted(os.listdir(args.directory)):
+        path = os.path.join(args.directory, name)
+        files = [os.path.join(path, f) for f in os.listdir(path)] if os.path.isdir(path) else [path]
+        line = f"  {name:<40} {sum(os.path.getsize(f) for f in files) / 2**20:>8.2f} MB"
+        if name.endswith('.npz'):
+            # Exported forests record the sha256 of the model they come from
+            source = FlatForest.metadata(path).get('source_sha256')
+            line += f"  from model {str(source)[:16]}"
+        print(line)
+
+
+def correlation_command(args):
+    import numpy as np
+    from churn import data
+    from churn.correlation import CorrelationEngine
+
+    engine = CorrelationEngine()
+    engine.sync(data.load_excel_cached(args.dataset))
+    matrix = engine.matrix()
+    heat = data.load_heatdf(args.heat)
+    # heat.xlsx names the device classes 'Low End', 'Mid End' and 'High End'
+    names = {'Device Class_Low': 'Device Class_Low End', 'Device Class_Medium': 'Device Class_Mid End',
+             'Device Class_High': 'Device Class_High End'}
+    matrix = matrix.rename(index=names, columns=names)
+    common = [column for column in matrix.columns if column in heat.columns]
+    difference = np.nanmax(np.abs(matrix.loc[common, common].to_numpy() - heat.loc[common, common].to_numpy()))
+    print(f"{engine.rows:,} rows, {len(engine.partitions)} locations, {len(common)} columns compared, "
+          f"max |difference| to {os.path.basename(args.heat)}: {difference:.2e}")
+    return 0 if difference <= args.tolerance else 1
+
+
+def train_command(args):
+    from churn import data, evaluation, training
+
+    decdf = data.load_excel_cached(args.dataset)
+    print(f"Searching {args.n_candidates} candidates on {os.cpu_count()} cores ...", flush=True)
+    model, metadata, report = training.train(decdf, args.n_candidates, args.factor, args.cv, args.scoring, args.n_jobs)
+
+    path = args.output or training.versioned_path()
+    metadata = training.save(model, metadata, path)
+    report.update(model_sha256=metadata['model_sha256'], dataset_sha256=data.source_version(args.dataset))
+    evaluation.write_report(report, evaluation.report_path(path))
+
+    seconds = metadata['training_seconds']
+    print(f"params: {metadata['params']}")
+    print(f"cv {args.scoring}: {metadata['search']['best_cv_score']:.4f} "
+          f"(shipped parameters {metadata['search']['shipped_cv_score']:.4f})")
+    for split in ('train', 'test'):
+        print(f"{split}: " + ", ".join(f"{name} {value:.4f}" for name, value in metadata['metrics'][split].items()))
+    print(f"search {seconds['search']:.1f} s, refit {seconds['refit']:.1f} s, written to {path}")
+    if args.promote:
+        training.promote(path, args.promote_to)
+        print(f"Promoted to {args.promote_to}")
+
+
+def serve_command(args):
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("The scoring service needs an ASGI server: pip install uvicorn")
+
+    from churn.service import MicroBatcher, ScoringApp
+
+    app = ScoringApp(MicroBatcher(args.model, args.max_batch_size, args.max_wait_ms / 1000))
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+def benchmark_command(args):
+    from churn import benchmark, data, registry
+
+    model = registry.get_model_entry(args.model).model
+    baseline = benchmark.read_baseline(args.baseline)
+
+    print(f"{'stage':<14} {'scale':>6} {'rows':>10} {'seconds':>9} {'peak MB':>9} {'vs baseline':>20}")
+
+    def log(result):
+        [(_, base, time_ratio, memory_ratio, regressed)] = benchmark.compare([result], baseline, args.tolerance)
+        versus = f"{time_ratio:5.2f}x time {memory_ratio:5.2f}x mem" if base else "no baseline"
+        print(f"{result['stage']:<14} {result['scale']:>5}x {result['rows']:>10,} {result['seconds']:>9.3f} "
+              f"{result['peak_bytes'] / 2**20:>9.1f} {versus:>20}{'  REGRESSION' if regressed else ''}", flush=True)
+
+    results = benchmark.run(data.load_decdf(), model, args.scales, args.stages, args.repeats, log)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': benchmark.environment(), 'results': results}, f, indent=1)
+    if args.save_baseline:
+        benchmark.write_baseline(results, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    regressions = [row for row in benchmark.compare(results, baseline, args.tolerance) if row[-1]]
+    if regressions:
+        print(f"{len(regressions)} stages regressed by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+def scaling_command(args):
+    from churn import benchmark, data, registry
+
+    model = registry.get_model_entry(args.model).model
+    X = benchmark.synthetic_features(data.load_excel_cached(args.dataset), args.rows, args.seed)
+    print(f"{args.rows:,} synthetic rows, {os.cpu_count()} CPU cores")
+    print(f"{'workers':>8} {'seconds':>9} {'rows/sec':>12} {'speedup':>8}")
+    for result in benchmark.scoring_scaling(model, X, args.workers, args.repeats):
+        print(f"{result['workers']:>8} {result['seconds']:>9.3f} {result['rows_per_sec']:>12,.0f} {result['speedup']:>7.2f}x")
+
+
+def main(argv=None):
+    from churn import benchmark, data, evaluation, registry, shared, startup
+
+    parser = argparse.ArgumentParser(prog='python -m churn')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    evaluate = commands.add_parser('evaluate', help="regenerate the model evaluation report")
+    evaluate.add_argument('--model', default=registry.MODEL_PATH)
+    evaluate.add_argument('--dataset', default=data.DECDF_PATH)
+    evaluate.add_argument('-o', '--output', help="default: next to the model file")
+    evaluate.set_defaults(func=evaluate_command)
+
+    export_forest = commands.add_parser('export-forest', help="export the forest for the NumPy inference engine")
+    export_forest.add_argument('--model', default=registry.SKLEARN_MODEL_PATH)
+    export_forest.add_argument('-o', '--output', default=registry.FLAT_MODEL_PATH)
+    export_forest.add_argument('--n-trees', type=int, help="keep only the first trees")
+    export_forest.add_argument('--max-depth', type=int, help="cut the trees at this depth")
+    export_forest.add_argument('--compact', action='store_true', help="int8/int16 nodes and float32 leaf values")
+    export_forest.add_argument('--report', action='store_true', help="print size, load time and accuracy of every option")
+    export_forest.add_argument('--max-loss', type=float,
+                               help="export the smallest option losing at most this much --metric on the test split")
+    export_forest.add_argument('--metric', choices=['accuracy', 'roc_auc'], default='accuracy')
+    export_forest.add_argument('--dataset', default=data.DECDF_PATH)
+    export_forest.set_defaults(func=export_forest_command)
+
+    score = commands.add_parser('score', help="score an xlsx, CSV or Parquet file in chunks")
+    score.add_argument('input')
+    score.add_argument('-o', '--output', required=True, help="output .parquet or .csv file")
+    score.add_argument('--model', default=registry.MODEL_PATH)
+    score.add_argument('--workers', type=int, help="scoring threads (default: $CHURN_SCORING_WORKERS or all cores)")
+    score.add_argument('--chunk-size', type=int, default=50_000)
+    score.add_argument('--strict', action='store_true', help="exit with status 1 when some rows are invalid")
+    score.set_defaults(func=score_command)
+
+    train = commands.add_parser('train', help="retrain the model with a successive halving search")
+    train.add_argument('--dataset', default=data.DECDF_PATH)
+    train.add_argument('-o', '--output', help="model path (default: models/random_forest_model-<timestamp>.joblib)")
+    train.add_argument('--n-candidates', type=int, default=60)
+    train.add_argument('--factor', type=int, default=3)
+    train.add_argument('--cv', type=int, default=5)
+    train.add_argument('--scoring', default='roc_auc')
+    train.add_argument('--n-jobs', type=int, default=-1)
+    train.add_argument('--promote', action='store_true', help="also serve the new model from --promote-to")
+    train.add_argument('--promote-to', default=registry.SKLEARN_MODEL_PATH)
+    train.set_defaults(func=train_command)
+
+    serve = commands.add_parser('serve', help="run the HTTP scoring service")
+    serve.add_argument('--model', default=registry.MODEL_PATH)
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8000)
+    serve.add_argument('--max-batch-size', type=int, default=4096)
+    serve.add_argument('--max-wait-ms', type=float, default=2.0)
+    serve.set_defaults(func=serve_command)
+
+    bench = commands.add_parser('benchmark', help="time the dashboard stages and compare with the baseline")
+    bench.add_argument('--model', default=registry.MODEL_PATH)
+    bench.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help="dataset sizes as multiples of decdf")
+    bench.add_argument('--stages', nargs='+', choices=list(benchmark.STAGES))
+    bench.add_argument('--repeats', type=int, default=3)
+    bench.add_argument('--baseline', default=benchmark.BASELINE_PATH)
+    bench.add_argument('--save-baseline', action='store_true', help="store this run as the new baseline")
+    bench.add_argument('--tolerance', type=float, default=benchmark.DEFAULT_TOLERANCE)
+    bench.add_argument('-o', '--output', help="also write the results as JSON")
+    bench.set_defaults(func=benchmark_command)
+
+    scaling = commands.add_parser('scaling', help="measure batch scoring rows/sec per worker count")
+    scaling.add_argument('--model', default=registry.MODEL_PATH)
+    scaling.add_argument('--dataset', default=data.DECDF_PATH)
+    scaling.add_argument('--rows', type=int, default=1_000_000)
+    scaling.add_argument('--workers', type=int, nargs='+', help="worker counts to compare (default: 1, 2, 4, ... up to the core count)")
+    scaling.add_argument('--repeats', type=int, default=3)
+    scaling.add_argument('--seed', type=int, default=0)
+    scaling.set_defaults(func=scaling_command)
+
+    share = commands.add_parser('share', help="publish the dataset and model arrays for the dashboard processes to map")
+    share.add_argument('--directory', default=shared.SHARED_DIR, help="default: $CHURN_SHARED_DIR")
+    share.add_argument('--dataset', default=data.DECDF_PATH)
+    share.add_argument('--model', default=registry.MODEL_PATH)
+    share.set_defaults(func=share_command)
+
+    correlation = commands.add_parser('correlation', help="compare the computed correlations with heat.xlsx")
+    correlation.add_argument('--dataset', default=data.DECDF_PATH)
+    correlation.add_argument('--heat', default=data.HEAT_PATH)
+    correlation.add_argument('--tolerance', type=float, default=1e-6)
+    correlation.set_defaults(func=correlation_command)
+
+    import_budget = commands.add_parser('import-budget', help="fail when the dashboards' cold start imports regress")
+    import_budget.add_argument('scripts', nargs='*', help="dashboard scripts (default: both dashboards)")
+    import_budget.add_argument('--budget', type=float, default=startup.DEFAULT_BUDGET, help="seconds allowed per dashboard")
+    import_budget.add_argument('--repeats', type=int, default=3)
+    import_budget.set_defaults(func=import_budget_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+# Benchmarks on the bundled dataset and on synthetic data shaped like decdf
+#
+# The harness runs the dashboard's stages headless (loading the data,
+# building the churn cube, rendering the figures, evaluating the model and
+# scoring a batch) at several scales of the dataset, records the best time
+# and the peak memory of every stage and compares them with a stored
+# baseline.
+#
+#   python -m churn benchmark --scales 1 10 100 --save-baseline
+#   python -m churn benchmark --scales 1 10 100          # exit 1 on regressions
+#   python -m churn scaling --rows 1000000 --workers 1 2 4 8 16 32
+import os
+import json
+import time
+import tempfile
+import platform
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from churn.encoding import feature_encoder, nama_feature
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'benchmark_baseline.json')
+BASELINE_VERSION = 1
+
+# A stage is slower or bigger than its baseline by more than this fraction
+DEFAULT_TOLERANCE = 0.25
+
+# ... and by more than this much, so timer noise on tiny stages is ignored
+MIN_DELTA_SECONDS = 0.01
+MIN_DELTA_BYTES = 2**20
+
+
+def synthetic_decdf(decdf, n_rows, seed=0):
+    """decdf-shaped frame of `n_rows` customers.
+
+    Every column is sampled independently from its own distribution in
+    decdf, so values and tree paths look like real customers while the rows
+    are (almost) never exact copies of each other.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({column: rng.choice(decdf[column].to_numpy(), size=n_rows) for column in decdf.columns})
+
+
+def synthetic_features(decdf, n_rows, seed=0):
+    """Encoded feature matrix of `n_rows` synthetic customers."""
+    return synthetic_decdf(decdf[nama_feature], n_rows, seed).to_numpy(dtype=np.float64)
+
+
+def raw_features(decdf):
+    """The model features of decdf as an upload has them, with text categories."""
+    raw = decdf[nama_feature].copy()
+    for feature in feature_encoder.categories:
+        raw[feature] = feature_encoder.decode(feature, raw[feature])
+    return raw
+
+
+class Workload:
+    """Everything the stages need at one scale, prepared before timing."""
+
+    def __init__(self, decdf, model, scale, workdir):
+        from churn.data import DECDF_PATH, compact_dtypes
+
+        self.scale = scale
+        self.source = DECDF_PATH
+        self.decdf = decdf if scale == 1 else compact_dtypes(synthetic_decdf(decdf, len(decdf) * scale))
+        self.model = model
+        self.raw = raw_features(self.decdf)
+        self.parquet_path = os.path.join(workdir, f'decdf-{scale}x.parquet')
+        self.decdf.to_parquet(self.parquet_path, index=False)
+
+    @property
+    def rows(self):
+        return len(self.decdf)
+
+
+def stage_load_xlsx(work):
+    pd.read_excel(work.source)
+
+
+def stage_load_parquet(work):
+    pd.read_parquet(work.parquet_path)
+
+
+def stage_cube(work):
+    from churn.crosstab import ChurnCube
+
+    ChurnCube(work.decdf)
+
+
+def stage_correlation(work):
+    from churn.correlation import CorrelationEngine
+
+    CorrelationEngine().sync(work.decdf)
+
+
+def dashboard_figures(decdf, locations=(0, 1)):
+    """Render functions of the figures on the dashboard, with every tab open."""
+    from churn.charts import churn_countplot, churn_pie
+    from churn.correlation import CorrelationEngine
+    from churn.crosstab import ChurnCube
+    from churn.locations import LocationIndex
+    from churn.sections import sections
+
+    cube = ChurnCube(decdf)
+    correlations = CorrelationEngine()
+    correlations.sync(decdf)
+    locations = list(locations)
+    index = LocationIndex(decdf)
+    location_labels = [index.name(code) for code in locations]
+    renders = [
+        lambda: churn_pie(cube.churn_counts(locations=locations)),
+        lambda: churn_countplot(cube.counts('Location', locations), 'Location', location_labels),
+    ]
+    for section in sections:
+        renders += [render for _, render in section.figures(cube, correlations, locations)]
+    return renders
+
+
+def stage_figures(work):
+    from churn.figures import figure_png
+
+    for render in dashboard_figures(work.decdf):
+        figure_png(render())
+
+
+def stage_evaluate(work):
+    from churn.evaluation import evaluate
+
+    evaluate(work.model, work.decdf)
+
+
+def stage_score(work):
+    from churn.scoring import score_frame
+
+    score_frame(work.model, work.raw)
+
+
+# name -> (stage, whether it grows with the data)
+STAGES = {
+    'load_xlsx': (stage_load_xlsx, False),
+    'load_parquet': (stage_load_parquet, True),
+    'cube': (stage_cube, True),
+    'correlation': (stage_correlation, True),
+    'figures': (stage_figures, False),
+    'evaluate': (stage_evaluate, True),
+    'score': (stage_score, True),
+}
+
+
+def measure(func, *args, repeats=3):
+    """Best wall time of `repeats` runs, then the peak traced memory of one more.
+
+    Memory is traced in a separate run because tracemalloc slows down code
+    that allocates many small objects by several times.
+    """
+    seconds = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(*args)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    if not tracing:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def run(decdf, model, scales=(1, 10, 100), stages=None, repeats=3, log=None):
+    """Time and peak memory of every stage at every scale."""
+    stages = stages or list(STAGES)
+    results = []
+    with tempfile.TemporaryDirectory(prefix='churn-benchmark-') as workdir:
+        for scale in scales:
+            work = Workload(decdf, model, scale, workdir)
+            for name in stages:
+                stage, scaled = STAGES[name]
+                # Stages that do not depend on the data size only run on the bundled data
+                if not scaled and scale != 1:
+                    continue
+                seconds, peak = measure(stage, work, repeats=repeats)
+                result = {'stage': name, 'scale': scale, 'rows': work.rows, 'seconds': seconds, 'peak_bytes': peak}
+                results.append(result)
+                if log is not None:
+                    log(result)
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def read_baseline(path=BASELINE_PATH):
+    try:
+        with open(path) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        return None
+    if baseline.get('version') != BASELINE_VERSION:
+        return None
+    return baseline
+
+
+def write_baseline(results, path=BASELINE_PATH):
+    with open(path, 'w') as f:
+        json.dump({'version': BASELINE_VERSION, 'environment': environment(), 'results': results}, f, indent=1)
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """(result, baseline result or None, time ratio, memory ratio, regressed) per result."""
+    previous = {(r['stage'], r['scale']): r for r in baseline['results']} if baseline else {}
+    rows = []
+    for result in results:
+        base = previous.get((result['stage'], result['scale']))
+        if base is None:
+            rows.append((result, None, None, None, False))
+            continue
+        time_ratio = result['seconds'] / max(base['seconds'], 1e-9)
+        memory_ratio = result['peak_bytes'] / max(base['peak_bytes'], 1)
+        slower = time_ratio > 1 + tolerance and result['seconds'] - base['seconds'] > MIN_DELTA_SECONDS
+        bigger = memory_ratio > 1 + tolerance and result['peak_bytes'] - base['peak_bytes'] > MIN_DELTA_BYTES
+        regressed = slower or bigger
+        rows.append((result, base, time_ratio, memory_ratio, regressed))
+    return rows
+
+
+def scoring_scaling(model, X, workers=None, repeats=3):
+    """Best of `repeats` rows/sec of predict_proba for every worker count."""
+    from churn.scoring import predict_proba
+
+    if not workers:
+        workers = [1] + [2 ** i for i in range(1, 8) if 2 ** i <= (os.cpu_count() or 1)]
+    # Warm-up, the first call allocates the forest buffers and the pool
+    predict_proba(model, X[:1000], workers=max(workers))
+
+    results = []
+    for n in workers:
+        best = min(_timed(predict_proba, model, X, workers=n) for _ in range(repeats))
+        results.append({'workers': n, 'seconds': best, 'rows_per_sec': len(X) / best})
+    for result in results:
+        result['speedup'] = results[0]['seconds'] / result['seconds']
+    return results
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
@@ -0,0 +1,118 @@
+# Chart builders used by the dashboards
+#
+# Every function draws on its own matplotlib Figure instead of the global
+# pyplot state, so figures can be rendered to PNG once and cached.
+#
+# seaborn and matplotlib are imported by the functions themselves: together
+# they take over a second to import, and a cached figure never needs them.
+
+churn_legend = ['No Churn', 'Churn']
+pie_labels = 'Loyal Client', 'Client Left'
+
+
+def churn_pie(sizes):
+    # Check for zero or negative values in sizes
+    if any(size <= 0 for size in sizes):
+        raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
+
+    from matplotlib.figure import Figure
+
+    fig = Figure()
+    ax = fig.subplots()
+    ax.pie(sizes, autopct='%1.1f%%',
+           explode=(0.1, 0.2), shadow=True, startangle=85,
+           pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
+    ax.axis('equal')
+    ax.legend(loc='best', labels=pie_labels)
+    return fig
+
+
+def churn_countplot(counts, feature, tick_labels, ylabel='Count', title=None, fontsize=8):
+    """Bars of `ChurnCube.counts` per feature value, split by Churn Label."""
+    import seaborn as sns
+    from matplotlib.figure import Figure
+
+    fig = Figure()
+    ax = fig.subplots()
+    sns.barplot(x=feature, y='Count', hue='Churn Label', data=counts, errorbar=None, ax=ax)
+
+    # Notation
+    for i, p in enumerate(ax.patches):
+        if i < len(ax.patches) - len(churn_legend):
+            ax.annotate(f'{p.get_height()}', (p.get_x() + p.get_width() / 2., p.get_height() / 100 + 50),
+                        ha='center', fontsize=fontsize, color='white')
+
+    # Xticks Label
+    ax.set_xticks(range(len(tick_labels)))
+    ax.set_xticklabels(tick_labels)
+
+    # Label
+    ax.set_xlabel(feature)
+    ax.set_ylabel(ylabel)
+    if title:
+        ax.set_title(title)
+
+    # Legend
+    ax.legend(title='Churn Label', labels=churn_legend, loc='best')
+    return fig
+
+
+def correlation_heatmap(heatdf, columns, title=None):
+    import seaborn as sns
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(12, 8))
+    ax = fig.subplots()
+    sns.heatmap(heatdf.loc[columns, columns], cmap='coolwarm', linewidths=.5, annot=True, fmt=".2f", ax=ax)
+    if title:
+        ax.set_title(title)
+
+    # Miringkan label sumbu x
+    for tick in ax.get_xticklabels():
+        tick.set_rotation(45)
+        tick.set_horizontalalignment('right')
+    for tick in ax.get_yticklabels():
+        tick.set_rotation(0)
+    return fig
+
+
+def report_heatmap(df_classification_report):
+    import seaborn as sns
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    sns.heatmap(df_classification_report.iloc[:-1, :].T, annot=True, cmap="Blues", ax=ax)
+    return fig
+
+
+def score_curves(curve):
+    """ROC, precision-recall and threshold sweep of an evaluation.ScoreCurve."""
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(15, 4.5))
+    ax_roc, ax_pr, ax_sweep = fig.subplots(1, 3)
+
+    fpr, tpr = curve.roc()
+    ax_roc.plot(fpr, tpr, label=f'AUC = {curve.roc_auc():.2f}')
+    ax_roc.plot([0, 1], [0, 1], linestyle='--', color='grey')
+    ax_roc.set_xlabel('False Positive Rate')
+    ax_roc.set_ylabel('True Positive Rate')
+    ax_roc.set_title('ROC Curve')
+    ax_roc.legend(loc='lower right')
+
+    precision, recall = curve.precision_recall()
+    ax_pr.plot(recall, precision, label=f'AP = {curve.average_precision():.2f}')
+    ax_pr.set_xlabel('Recall')
+    ax_pr.set_ylabel('Precision')
+    ax_pr.set_title('Precision-Recall Curve')
+    ax_pr.legend(loc='lower left')
+
+    thresholds, precision, recall, f1 = curve.sweep()
+    ax_sweep.plot(thresholds, precision, label='Precision')
+    ax_sweep.plot(thresholds, recall, label='Recall')
+    ax_sweep.plot(thresholds, f1, label='F1')
+    ax_sweep.set_xlabel('Threshold')
+    ax_sweep.set_title('Threshold Sweep')
+    ax_sweep.legend(loc='best')
+    return fig
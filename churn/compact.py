@@ -0,0 +1,105 @@
+# Size, load time and accuracy of compact forest exports
+#
+# Every export option gives up some accuracy for a smaller artifact: fewer
+# trees, trees cut at a smaller depth, smaller dtypes. The tradeoff report
+# exports a grid of them, scores each on the test split of the evaluation
+# report and times loading it, so the smallest artifact within an accepted
+# accuracy loss can be picked:
+#
+#   python -m churn export-forest --report
+#   python -m churn export-forest --max-loss 0.005
+import os
+import time
+
+import joblib
+import numpy as np
+
+from churn.forest import FlatForest
+
+
+class ExportOption:
+    """Trees kept, depth cut and dtypes of one forest export; None keeps the model's."""
+
+    def __init__(self, n_trees=None, max_depth=None, compact=False):
+        self.n_trees = n_trees
+        self.max_depth = max_depth
+        self.compact = compact
+
+    def export(self, model):
+        forest = FlatForest.from_sklearn(model, self.n_trees, self.max_depth)
+        return forest.compact() if self.compact else forest
+
+    def describe(self, model):
+        n_trees = self.n_trees or len(model.estimators_)
+        depth = 'full depth' if self.max_depth is None else f"depth {self.max_depth}"
+        return f"{n_trees} trees, {depth}, {'compact' if self.compact else 'float64'}"
+
+
+def export_options(model, tree_fractions=(1, 0.75, 0.5, 0.25), depth_cuts=(0, 2, 4)):
+    """A grid of options, from the exact export down to a quarter of the trees `max(depth_cuts)` levels shallower."""
+    n_trees = len(model.estimators_)
+    depth = max(estimator.tree_.max_depth for estimator in model.estimators_)
+    options = []
+    for fraction in tree_fractions:
+        trees = max(1, int(round(n_trees * fraction)))
+        for cut in depth_cuts:
+            if cut >= depth:
+                continue
+            for compact in (False, True):
+                options.append(ExportOption(None if trees == n_trees else trees, depth - cut if cut else None, compact))
+    return options
+
+
+def _best_seconds(load, path, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        load(path)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _row(label, model, path, load_seconds, X_test, y_test, reference):
+    from sklearn.metrics import accuracy_score, roc_auc_score
+
+    scores = model.predict_proba(X_test)[:, list(model.classes_).index(1)]
+    return {
+        'option': label,
+        'size_bytes': os.path.getsize(path),
+        'memory_bytes': model.nbytes if isinstance(model, FlatForest) else None,
+        'load_ms': load_seconds * 1000,
+        'accuracy': accuracy_score(y_test, model.predict(X_test)),
+        'roc_auc': roc_auc_score(y_test, scores),
+        'max_score_diff': float(np.abs(scores - reference).max()),
+    }
+
+
+def tradeoffs(model, model_path, X_test, y_test, options, workdir, repeats=5):
+    """One row per option, after a first row for the scikit-learn model at `model_path`.
+
+    Load times are the best of `repeats` loads with the file in the page
+    cache, which is what every worker after the first one sees. Accuracy
+    and ROC AUC losses are measured against the scikit-learn model.
+    """
+    reference = model.predict_proba(X_test)[:, list(model.classes_).index(1)]
+    base = _row('scikit-learn', model, model_path, _best_seconds(joblib.load, model_path, repeats),
+                X_test, y_test, reference)
+    rows = [base]
+    path = os.path.join(workdir, 'forest.npz')
+    for option in options:
+        forest = option.export(model)
+        forest.save(path)
+        row = _row(option.describe(model), forest, path, _best_seconds(FlatForest.load, path, repeats),
+                   X_test, y_test, reference)
+        row['export'] = option
+        rows.append(row)
+    for row in rows:
+        row['accuracy_loss'] = base['accuracy'] - row['accuracy']
+        row['roc_auc_loss'] = base['roc_auc'] - row['roc_auc']
+    return rows
+
+
+def choose(rows, max_loss, metric='accuracy'):
+    """The smallest export losing at most `max_loss` of `metric`, or None."""
+    candidates = [row for row in rows if 'export' in row and row[f'{metric}_loss'] <= max_loss]
+    return min(candidates, key=lambda row: row['size_bytes']) if candidates else None
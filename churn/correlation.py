@@ -0,0 +1,161 @@
+# One-hot correlation matrix computed from decdf
+#
+# The numeric columns and the one-hot columns of every categorical feature
+# form a design matrix Z. Its Pearson correlations only need the sufficient
+# statistics n, sum(Z) and Z'Z, which add up over any split of the rows. They
+# are kept per location partition, so a location filter sums a few small
+# matrices, and appended rows only add their own statistics instead of
+# recomputing everything.
+#
+# This replaces the frozen heat.xlsx in the dashboards; `python -m churn
+# correlation` checks that the two agree. Location is not one-hot encoded:
+# its columns would change with every new city, and they are constant
+# inside a location filter anyway.
+import threading
+
+import numpy as np
+import pandas as pd
+
+from churn.encoding import category_mappings
+from churn.locations import LocationIndex
+from churn.perf import span
+
+numeric_columns = ['Tenure Months', 'Monthly Purchase (Thou. IDR)', 'Longitude', 'Latitude', 'CLTV (Predicted Thou. IDR)']
+
+# Categorical feature -> {label: code}, one column per label named '<feature>_<label>'
+one_hot_columns = {**category_mappings, 'Churn Label': {'No': 0, 'Yes': 1}}
+
+
+class SufficientStats:
+    """n, column sums and cross products of a block of design matrix rows."""
+
+    def __init__(self, n_columns):
+        self.n = 0
+        self.sums = np.zeros(n_columns)
+        self.cross = np.zeros((n_columns, n_columns))
+
+    def add(self, Z):
+        self.n += len(Z)
+        self.sums += Z.sum(axis=0)
+        self.cross += Z.T @ Z
+
+    def merge(self, other):
+        self.n += other.n
+        self.sums += other.sums
+        self.cross += other.cross
+
+    def correlation(self):
+        """Pearson correlations, NaN for columns without variance."""
+        if self.n < 2:
+            return np.full(self.cross.shape, np.nan)
+        mean = self.sums / self.n
+        covariance = (self.cross - self.n * np.outer(mean, mean)) / (self.n - 1)
+        std = np.sqrt(np.clip(np.diag(covariance), 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = covariance / np.outer(std, std)
+        correlation[:, std == 0] = np.nan
+        correlation[std == 0, :] = np.nan
+        return np.clip(correlation, -1.0, 1.0)
+
+
+class CorrelationEngine:
+    """Sufficient statistics of decdf per location, updated as rows are appended."""
+
+    def __init__(self, numeric=numeric_columns, one_hot=one_hot_columns, location='Location'):
+        self.numeric = list(numeric)
+        self.one_hot = {feature: dict(mapping) for feature, mapping in one_hot.items()}
+        self.location = location
+        self.columns = self.numeric + [f'{feature}_{label}' for feature, mapping in self.one_hot.items() for label in mapping]
+        self.partitions = {}
+        self.rows = 0
+        # Order independent checksum of the rows seen so far
+        self.checksum = 0
+        # Numeric columns are shifted by their first mean, which keeps the
+        # sums of squares small without changing any correlation
+        self.shift = None
+        self._lock = threading.RLock()
+
+    @property
+    def source_columns(self):
+        return [self.location] + self.numeric + list(self.one_hot)
+
+    def design(self, frame):
+        """Design matrix of `frame`: shifted numeric columns, then the one-hot columns."""
+        Z = np.empty((len(frame), len(self.columns)))
+        numeric = frame[self.numeric].to_numpy(dtype=np.float64)
+        if self.shift is None:
+            self.shift = numeric.mean(axis=0) if len(numeric) else np.zeros(len(self.numeric))
+        Z[:, :len(self.numeric)] = numeric - self.shift
+        j = len(self.numeric)
+        for feature, mapping in self.one_hot.items():
+            values = frame[feature].to_numpy()
+            for code in mapping.values():
+                Z[:, j] = values == code
+                j += 1
+        return Z
+
+    def _checksum(self, frame):
+        hashes = pd.util.hash_pandas_object(frame[self.source_columns], index=False).to_numpy()
+        # uint64 sums wrap around, i.e. they are taken modulo 2**64
+        return int(hashes.sum(dtype=np.uint64))
+
+    def append(self, frame):
+        """Add the statistics of new rows to their location partitions."""
+        if not len(frame):
+            return
+        with self._lock, span('correlation/append'):
+            Z = self.design(frame)
+            for code, rows in LocationIndex(frame, self.location).partitions.items():
+                stats = self.partitions.get(code)
+                if stats is None:
+                    stats = self.partitions[code] = SufficientStats(len(self.columns))
+                stats.add(Z[rows])
+            self.rows += len(frame)
+            self.checksum = (self.checksum + self._checksum(frame)) % 2**64
+
+    def sync(self, frame):
+        """Bring the statistics up to date with `frame`.
+
+        When `frame` starts with the rows seen so far (in any order, like the
+        statistics themselves) only the new rows are added; any other change
+        rebuilds the statistics from scratch.
+        """
+        with self._lock:
+            if len(frame) >= self.rows and (self.rows == 0 or self._checksum(frame.iloc[:self.rows]) == self.checksum):
+                self.append(frame.iloc[self.rows:])
+                return
+            self.partitions.clear()
+            self.rows = 0
+            self.checksum = 0
+            self.shift = None
+            self.append(frame)
+
+    def stats(self, locations=None):
+        total = SufficientStats(len(self.columns))
+        with self._lock:
+            for code in list(self.partitions) if locations is None else locations:
+                if code in self.partitions:
+                    total.merge(self.partitions[code])
+        return total
+
+    def matrix(self, locations=None, columns=None):
+        """Correlation matrix of the selected locations as a labelled DataFrame."""
+        corr = pd.DataFrame(self.stats(locations).correlation(), index=self.columns, columns=self.columns)
+        return corr if columns is None else corr.loc[columns, columns]
+
+
+_engine = None
+_last = None
+_engine_lock = threading.Lock()
+
+
+def correlation_engine(decdf):
+    """The process-wide CorrelationEngine, synced whenever a different frame is passed."""
+    global _engine, _last
+    with _engine_lock:
+        if _engine is None:
+            _engine = CorrelationEngine()
+        if _last is not decdf:
+            _engine.sync(decdf)
+            _last = decdf
+        return _engine
@@ -0,0 +1,97 @@
+# Churn count cube shared by every comparison chart
+#
+# The count plots and pies only need the number of customers per
+# (Location, feature value, Churn Label). All of them are computed with a
+# single np.bincount over the whole table, so a location filter change is a
+# small sum over the cube instead of a boolean scan of decdf per chart.
+import numpy as np
+import pandas as pd
+
+from churn.perf import span
+
+# Columns with a count plot or pies in the dashboards
+cube_features = ['Location', 'Call Center', 'Games Product', 'Music Product',
+                 'Education Product', 'Use MyApp', 'Video Product', 'Payment Method']
+
+
+class ChurnCube:
+    """Counts of customers per (Location, feature, feature value, Churn Label)."""
+
+    def __init__(self, decdf, features=cube_features, location='Location', target='Churn Label'):
+        self.location = location
+        self.target = target
+        self.locations = np.unique(decdf[location].to_numpy())
+        self.classes = np.unique(decdf[target].to_numpy())
+        self.values = {feature: np.unique(decdf[feature].to_numpy()) for feature in features}
+
+        n_loc, n_cls = len(self.locations), len(self.classes)
+        loc_idx = np.searchsorted(self.locations, decdf[location].to_numpy())
+        cls_idx = np.searchsorted(self.classes, decdf[target].to_numpy())
+
+        # Every feature gets its own block of the flat key space, so one
+        # bincount over all (row, feature) keys fills the whole cube
+        keys = np.empty((len(decdf), len(features)), dtype=np.int64)
+        offsets = {}
+        offset = 0
+        for j, feature in enumerate(features):
+            values = self.values[feature]
+            val_idx = np.searchsorted(values, decdf[feature].to_numpy())
+            keys[:, j] = offset + (loc_idx * len(values) + val_idx) * n_cls + cls_idx
+            offsets[feature] = offset
+            offset += n_loc * len(values) * n_cls
+
+        flat = np.bincount(keys.ravel(), minlength=offset)
+        self.cube = {
+            feature: flat[offsets[feature]:offsets[feature] + n_loc * len(self.values[feature]) * n_cls]
+            .reshape(n_loc, len(self.values[feature]), n_cls)
+            for feature in features
+        }
+
+    def _location_mask(self, locations):
+        if locations is None:
+            return slice(None)
+        return np.isin(self.locations, list(locations))
+
+    def table(self, feature, locations=None):
+        """(feature value x churn class) counts summed over the selected locations."""
+        return self.cube[feature][self._location_mask(locations)].sum(axis=0)
+
+    def churn_counts(self, feature=None, value=None, locations=None):
+        """[loyal, left] counts for one feature value, or for everyone if feature is None."""
+        if feature is None:
+            counts = self.table(self.location, locations).sum(axis=0)
+        else:
+            row = np.searchsorted(self.values[feature], value)
+            if row >= len(self.values[feature]) or self.values[feature][row] != value:
+                counts = np.zeros(len(self.classes), dtype=np.int64)
+            else:
+                counts = self.table(feature, locations)[row]
+        return [int(count) for count in counts]
+
+    def counts(self, feature, locations=None):
+        """Tidy frame for sns.barplot with the bars sns.countplot would draw.
+
+        Only the (value, class) pairs present in the selection are kept, like
+        countplot does when it counts the filtered rows itself.
+        """
+        table = self.table(feature, locations)
+        values, classes = np.nonzero(table)
+        return pd.DataFrame({
+            feature: self.values[feature][values],
+            self.target: self.classes[classes],
+            'Count': table[values, classes],
+        })
+
+
+_last = (None, None)
+
+
+def churn_cube(decdf):
+    """The ChurnCube of `decdf`, rebuilt only when a different frame is passed."""
+    global _last
+    frame, cube = _last
+    if frame is not decdf:
+        with span('crosstab/build'):
+            cube = ChurnCube(decdf)
+        _last = (decdf, cube)
+    return cube
@@ -0,0 +1,146 @@
+# Dataset loading with a Parquet cache next to the Excel sources
+#
+# Parsing xlsx with openpyxl is the slowest step of a page load. Each source
+# is converted once into a Parquet file with compact dtypes (int8 codes,
+# float32 numerics) and later loads read the Parquet file. The cache records
+# the fingerprint of the xlsx it was built from and is rebuilt when it changes.
+import os
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from churn import shared
+from churn.hashing import file_sha256
+from churn.perf import span
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET_DIR = os.path.join(ROOT, 'dataset')
+DECDF_PATH = os.path.join(DATASET_DIR, 'decdf.xlsx')
+HEAT_PATH = os.path.join(DATASET_DIR, 'heat.xlsx')
+
+# Key of the source fingerprint inside the Parquet schema metadata
+_META_KEY = b'churn.source'
+
+# source -> ((mtime_ns, size), sha256, frame) for the current process
+_frames = {}
+
+
+def cache_path(source):
+    return os.path.splitext(source)[0] + '.parquet'
+
+
+def compact_dtypes(df):
+    """Downcast integer columns to the smallest int (int8 for the codes) and floats to float32."""
+    df = df.copy()
+    for column in df.columns:
+        kind = df[column].dtype.kind
+        if kind in 'iu':
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+        elif kind == 'f':
+            df[column] = df[column].astype(np.float32)
+    return df
+
+
+def _fingerprint(source, sha256=None):
+    st = os.stat(source)
+    return {
+        'mtime_ns': st.st_mtime_ns,
+        'size': st.st_size,
+        'sha256': sha256 or file_sha256(source),
+    }
+
+
+def _cached_fingerprint(path):
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+    except (OSError, ValueError):
+        return None
+    raw = metadata.get(_META_KEY)
+    return json.loads(raw) if raw else None
+
+
+def _is_fresh(source, cached):
+    if cached is None:
+        return False
+    st = os.stat(source)
+    if (cached['mtime_ns'], cached['size']) == (st.st_mtime_ns, st.st_size):
+        return True
+    # The file was touched or copied, only its content matters
+    return cached['sha256'] == file_sha256(source)
+
+
+def _write_cache(df, path, fingerprint):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df)
+    metadata = dict(table.schema.metadata or {})
+    metadata[_META_KEY] = json.dumps(fingerprint).encode()
+    table = table.replace_schema_metadata(metadata)
+    # Write to a temporary file first so readers never see half a file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def build_cache(source, sha256=None, **read_kwargs):
+    """Convert `source` to its Parquet cache and return the compact frame.
+
+    `sha256` is the digest of `source` when the caller already hashed it.
+    """
+    with span('data/read_excel'):
+        df = compact_dtypes(pd.read_excel(source, **read_kwargs))
+    try:
+        _write_cache(df, cache_path(source), _fingerprint(source, sha256))
+    except OSError:
+        # Read-only deployment, serve the freshly parsed frame without caching
+        pass
+    return df
+
+
+def load_excel_cached(source, **read_kwargs):
+    """Load `source` from its Parquet cache, (re)building the cache if stale.
+
+    The frame is also kept in memory for the process and the same object is
+    returned while the source is unchanged, so callers must not modify it.
+    With CHURN_SHARED_DIR set its columns are read-only memory maps shared
+    by every process of the host.
+    """
+    st = os.stat(source)
+    stat = (st.st_mtime_ns, st.st_size)
+    memo = _frames.get(source)
+    if memo is not None and memo[0] == stat:
+        return memo[2]
+
+    path = cache_path(source)
+    cached = _cached_fingerprint(path)
+    if _is_fresh(source, cached):
+        sha256 = cached['sha256']
+
+        def load():
+            with span('data/read_parquet'):
+                return pd.read_parquet(path)
+    else:
+        sha256 = file_sha256(source)
+
+        def load():
+            return build_cache(source, sha256, **read_kwargs)
+
+    df = shared.shared_frame(source, sha256, load) if shared.SHARED_DIR else load()
+    _frames[source] = (stat, sha256, df)
+    return df
+
+
+def source_version(source):
+    """sha256 of the source behind the frame `load_excel_cached` currently serves."""
+    memo = _frames.get(source)
+    return memo[1] if memo is not None else file_sha256(source)
+
+
+def load_decdf():
+    return load_excel_cached(DECDF_PATH)
+
+
+def load_heatdf(path=HEAT_PATH):
+    return load_excel_cached(path, index_col=0)
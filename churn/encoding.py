@@ -0,0 +1,175 @@
+# Feature encoding shared by the form, batch scoring and the service
+#
+# One FeatureEncoder owns the schema of the 11 model features. Every input
+# shape (a single value, a customer record, lists, DataFrames, NumPy arrays)
+# is turned into columns and encoded column-wise through precomputed lookup
+# tables, so there is no per-row dict lookup on any path.
+import numpy as np
+import pandas as pd
+
+# Same order as `nama_feature` in the dashboards, the model was trained on it
+nama_feature = ['Tenure Months', 'Device Class',
+                'Games Product', 'Music Product',
+                'Education Product', 'Use MyApp',
+                'Video Product', 'Monthly Purchase (Thou. IDR)',
+                'Call Center', 'CLTV (Predicted Thou. IDR)', 'Payment Method']
+
+# Convert categorical features to numerical values
+category_mappings = {
+    'Device Class': {'Low': 0, 'Medium': 1, 'High': 2},
+    'Games Product': {'No': 0, 'Yes': 1, 'No internet service': 3},
+    'Music Product': {'No': 0, 'Yes': 1, 'No internet service': 3},
+    'Education Product': {'No': 0, 'Yes': 1, 'No internet service': 3},
+    'Use MyApp': {'No': 0, 'Yes': 1, 'No internet service': 3},
+    'Video Product': {'No': 0, 'Yes': 1, 'No internet service': 3},
+    'Call Center': {'No': 0, 'Yes': 1},
+    'Payment Method': {'Digital Wallet': 0, 'Pulsa': 1, 'Debit': 2, 'Credit': 3},
+}
+
+# Bumped whenever the schema or a mapping changes, stored with trained models
+ENCODER_VERSION = 1
+
+
+class MissingColumnsError(KeyError):
+    """The input does not have every column of `nama_feature`."""
+
+    def __init__(self, columns):
+        super().__init__(columns)
+        self.columns = list(columns)
+
+    def __str__(self):
+        return ", ".join(repr(column) for column in self.columns)
+
+
+class EncodingError(ValueError):
+    """Some values could not be encoded; `errors` lists every invalid cell."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        cells = ", ".join(f"{column}={value!r}" for column, value in zip(errors['Column'], errors['Value']))
+        super().__init__(f"Invalid values: {cells}")
+
+
+def _object_column(values):
+    """1D object array of `values`; lists and other sequences stay single cells."""
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+class FeatureEncoder:
+    """Encodes raw customer data into the model's float feature matrix."""
+
+    def __init__(self, features=nama_feature, categories=category_mappings):
+        self.features = list(features)
+        self.categories = {feature: list(mapping) for feature, mapping in categories.items()}
+        # Lookup table per categorical feature: categorical code -> model value
+        self.tables = {feature: np.array(list(mapping.values()), dtype=np.float64)
+                       for feature, mapping in categories.items()}
+        # Model value -> label, for turning encoded data back into text
+        self.labels = {}
+        for feature, mapping in categories.items():
+            labels = np.full(max(mapping.values()) + 1, None, dtype=object)
+            labels[list(mapping.values())] = list(mapping)
+            self.labels[feature] = labels
+
+    def encode_column(self, feature, values):
+        """Encoded float array of one column and the mask of values that could not be encoded."""
+        if feature in self.tables:
+            # Categorical codes index into the lookup table, unknown values get -1
+            try:
+                codes = pd.Categorical(values, categories=self.categories[feature]).codes
+            except TypeError:
+                # Lists or dicts from JSON cannot be looked up, they are unknown values too
+                values = np.asarray(values, dtype=object)
+                scalar = np.fromiter((np.isscalar(value) or value is None for value in values), bool, len(values))
+                codes = pd.Categorical(np.where(scalar, values, None), categories=self.categories[feature]).codes
+            bad = codes < 0
+            encoded = np.where(bad, np.nan, self.tables[feature][codes])
+        else:
+            encoded = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+            # The forest takes float32, so infinite or larger values cannot be scored either
+            with np.errstate(invalid='ignore'):
+                bad = ~np.isfinite(encoded) | (np.abs(encoded) > np.finfo(np.float32).max)
+        return encoded, bad
+
+    def encode_value(self, feature, value):
+        encoded, bad = self.encode_column(feature, np.array([value], dtype=object))
+        if bad[0]:
+            raise EncodingError(pd.DataFrame({'Index': [0], 'Column': [feature], 'Value': [value]}))
+        return float(encoded[0])
+
+    def columns(self, data):
+        """Feature name -> 1D array of raw values, for any supported input shape."""
+        if isinstance(data, pd.DataFrame):
+            missing = [feature for feature in self.features if feature not in data.columns]
+            if missing:
+                raise MissingColumnsError(missing)
+            return {feature: data[feature].to_numpy() for feature in self.features}
+
+        if isinstance(data, dict):
+            data = [data]
+        if isinstance(data, (list, tuple)) and data and isinstance(data[0], dict):
+            missing = [feature for feature in self.features if not any(feature in record for record in data)]
+            if missing:
+                raise MissingColumnsError(missing)
+            return {feature: _object_column([record.get(feature) for record in data])
+                    for feature in self.features}
+
+        # Values in `nama_feature` order: one row, or a sequence / array of rows
+        shape_error = ValueError(f"Expected rows of {len(self.features)} values in nama_feature order")
+        if isinstance(data, np.ndarray) and data.ndim == 2:
+            if data.shape[1] != len(self.features):
+                raise shape_error
+            array = data.astype(object, copy=False)
+            return {feature: array[:, j] for j, feature in enumerate(self.features)}
+        rows = list(data)
+        # Rows are sequences themselves, anything else makes a single row
+        if not all(isinstance(row, (list, tuple, np.ndarray)) for row in rows):
+            rows = [rows]
+        if any(len(row) != len(self.features) for row in rows):
+            raise shape_error
+        return {feature: _object_column([row[j] for row in rows]) for j, feature in enumerate(self.features)}
+
+    def encode(self, data):
+        """Encode every row of `data` at once.
+
+        Returns the float matrix in `nama_feature` order, a boolean mask of the
+        rows that could be encoded and a DataFrame listing every invalid cell
+        by row position. Raises MissingColumnsError when a feature is absent.
+        """
+        columns = self.columns(data)
+        n_rows = len(columns[self.features[0]])
+        X = np.empty((n_rows, len(self.features)), dtype=np.float64)
+        valid = np.ones(n_rows, dtype=bool)
+        errors = []
+
+        for j, feature in enumerate(self.features):
+            X[:, j], bad = self.encode_column(feature, columns[feature])
+            if bad.any():
+                valid &= ~bad
+                errors.append(pd.DataFrame({
+                    'Index': np.flatnonzero(bad),
+                    'Column': feature,
+                    'Value': columns[feature][bad],
+                }))
+
+        if errors:
+            errors = pd.concat(errors, ignore_index=True).sort_values('Index', kind='stable', ignore_index=True)
+        else:
+            errors = pd.DataFrame(columns=['Index', 'Column', 'Value'])
+        return X, valid, errors
+
+    def transform(self, data):
+        """Encoded matrix of `data`, raising EncodingError if any value is invalid."""
+        X, valid, errors = self.encode(data)
+        if not valid.all():
+            raise EncodingError(errors)
+        return X
+
+    def decode(self, feature, values):
+        """Labels of encoded values of a categorical feature."""
+        return self.labels[feature][np.asarray(values).astype(np.intp)]
+
+
+feature_encoder = FeatureEncoder()
@@ -0,0 +1,218 @@
+# Evaluation report of the Random Forest model
+#
+# The train/test metrics only depend on the model file and the dataset, so
+# they are computed once per (model sha256, dataset sha256) and stored in a
+# small JSON artifact next to the model. The artifact is not versioned: the
+# first dashboard load builds it, or `python -m churn evaluate` offline.
+#
+# The model is scored once with predict_proba. ROC, precision-recall and
+# threshold sweeps are all derived from the cumulative class counts over the
+# sorted scores, so any threshold is a binary search away.
+#
+# scikit-learn is only imported when a report has to be (re)built, reading
+# the artifact needs NumPy alone.
+import os
+import json
+import threading
+
+import numpy as np
+
+from churn.encoding import nama_feature
+from churn.perf import span
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORT_PATH = os.path.join(ROOT, 'random_forest_model.metrics.json')
+
+# Bumped when the report layout changes so older artifacts are rebuilt
+REPORT_VERSION = 2
+
+# model.predict picks class 1 when its probability is above this
+DEFAULT_THRESHOLD = 0.5
+
+_lock = threading.Lock()
+_reports = {}
+
+
+def report_path(model_path):
+    """Report artifact next to a model file; other model formats get their own."""
+    stem, ext = os.path.splitext(model_path)
+    if ext == '.joblib':
+        return stem + '.metrics.json'
+    return model_path + '.metrics.json'
+
+
+def split_dataset(decdf):
+    from sklearn.model_selection import train_test_split
+
+    X = decdf[nama_feature].values
+    y = decdf['Churn Label'].values
+    return train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+
+class ScoreCurve:
+    """Cumulative class counts over the distinct scores of one evaluation set.
+
+    A customer is predicted to churn when its score is above the threshold.
+    `negatives_le[i]` / `positives_le[i]` count the customers of each class
+    with a score <= `scores[i]`, which is all a confusion matrix needs.
+    """
+
+    def __init__(self, scores, negatives_le, positives_le):
+        self.scores = np.asarray(scores, dtype=np.float64)
+        self.negatives_le = np.asarray(negatives_le, dtype=np.int64)
+        self.positives_le = np.asarray(positives_le, dtype=np.int64)
+        self.n_negative = int(self.negatives_le[-1]) if len(self.scores) else 0
+        self.n_positive = int(self.positives_le[-1]) if len(self.scores) else 0
+
+    @classmethod
+    def from_scores(cls, y_true, scores):
+        order = np.argsort(scores, kind='mergesort')
+        scores = np.asarray(scores, dtype=np.float64)[order]
+        positive = np.asarray(y_true)[order] == 1
+        # Last index of every run of equal scores
+        last = np.r_[np.flatnonzero(np.diff(scores)), len(scores) - 1]
+        positives_le = np.cumsum(positive)[last]
+        negatives_le = (last + 1) - positives_le
+        return cls(scores[last], negatives_le, positives_le)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['scores'], data['negatives_le'], data['positives_le'])
+
+    def to_dict(self):
+        return {
+            'scores': self.scores.tolist(),
+            'negatives_le': self.negatives_le.tolist(),
+            'positives_le': self.positives_le.tolist(),
+        }
+
+    def confusion(self, threshold=DEFAULT_THRESHOLD):
+        """[[tn, fp], [fn, tp]] when predicting churn for scores above threshold."""
+        k = np.searchsorted(self.scores, threshold, side='right')
+        tn = int(self.negatives_le[k - 1]) if k else 0
+        fn = int(self.positives_le[k - 1]) if k else 0
+        return np.array([[tn, self.n_negative - tn], [fn, self.n_positive - fn]])
+
+    def _counts(self):
+        # True and false positives from the strictest threshold (nobody
+        # predicted to churn) down to the loosest (everybody)
+        tps = np.r_[0, self.n_positive - self.positives_le[::-1][1:], self.n_positive]
+        fps = np.r_[0, self.n_negative - self.negatives_le[::-1][1:], self.n_negative]
+        return tps, fps
+
+    def roc(self):
+        """(fpr, tpr) from the strictest to the loosest threshold."""
+        tps, fps = self._counts()
+        return fps / max(self.n_negative, 1), tps / max(self.n_positive, 1)
+
+    def roc_auc(self):
+        fpr, tpr = self.roc()
+        return float(np.trapz(tpr, fpr))
+
+    def precision_recall(self):
+        """(precision, recall) from the strictest to the loosest threshold."""
+        tps, fps = self._counts()
+        predicted = tps + fps
+        precision = np.divide(tps, predicted, out=np.ones(len(tps)), where=predicted > 0)
+        return precision, tps / max(self.n_positive, 1)
+
+    def average_precision(self):
+        precision, recall = self.precision_recall()
+        return float(np.sum(np.diff(recall) * precision[1:]))
+
+    def sweep(self):
+        """Thresholds with the precision, recall and F1 of predicting churn above each."""
+        tp = self.n_positive - self.positives_le
+        fp = self.n_negative - self.negatives_le
+        predicted = tp + fp
+        precision = np.divide(tp, predicted, out=np.ones(len(tp)), where=predicted > 0)
+        recall = tp / max(self.n_positive, 1)
+        denominator = precision + recall
+        f1 = np.divide(2 * precision * recall, denominator, out=np.zeros(len(tp)), where=denominator > 0)
+        return self.scores, precision, recall, f1
+
+
+def _metrics(y_true, y_pred, curve):
+    from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+
+    return {
+        'accuracy': accuracy_score(y_true, y_pred),
+        'f1': f1_score(y_true, y_pred),
+        'precision': precision_score(y_true, y_pred),
+        'recall': recall_score(y_true, y_pred),
+        'roc_auc': curve.roc_auc(),
+        'average_precision': curve.average_precision(),
+    }
+
+
+def churn_scores(model, X):
+    return model.predict_proba(X)[:, list(model.classes_).index(1)]
+
+
+def evaluate(model, decdf):
+    """Metrics of `model` on the same stratified 80/20 split it was trained with."""
+    from sklearn.metrics import classification_report
+
+    X_train, X_test, y_train, y_test = split_dataset(decdf)
+    train_scores = churn_scores(model, X_train)
+    test_scores = churn_scores(model, X_test)
+    # Same decision as model.predict for the two classes
+    y_train_pred = (train_scores > DEFAULT_THRESHOLD).astype(int)
+    y_test_pred = (test_scores > DEFAULT_THRESHOLD).astype(int)
+
+    train_curve = ScoreCurve.from_scores(y_train, train_scores)
+    test_curve = ScoreCurve.from_scores(y_test, test_scores)
+    return {
+        'version': REPORT_VERSION,
+        'train': _metrics(y_train, y_train_pred, train_curve),
+        'test': _metrics(y_test, y_test_pred, test_curve),
+        'classification_report': classification_report(y_test, y_test_pred, output_dict=True),
+        'test_curve': test_curve.to_dict(),
+    }
+
+
+def read_report(path=REPORT_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_report(report, path=REPORT_PATH):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp, path)
+
+
+@span('evaluation/build')
+def build_report(model, decdf, model_sha256, dataset_sha256, path=REPORT_PATH):
+    report = evaluate(model, decdf)
+    report['model_sha256'] = model_sha256
+    report['dataset_sha256'] = dataset_sha256
+    try:
+        write_report(report, path)
+    except OSError:
+        # Read-only deployment, keep the report in memory only
+        pass
+    return report
+
+
+def load_report(model, decdf, model_sha256, dataset_sha256, path=REPORT_PATH):
+    """The evaluation report for this model and dataset, computed at most once."""
+    key = (model_sha256, dataset_sha256)
+    report = _reports.get(key)
+    if report is not None:
+        return report
+
+    with _lock:
+        report = _reports.get(key)
+        if report is not None:
+            return report
+        report = read_report(path)
+        if report is None or report.get('version') != REPORT_VERSION \
+                or (report.get('model_sha256'), report.get('dataset_sha256')) != key:
+            report = build_report(model, decdf, model_sha256, dataset_sha256, path)
+        _reports[key] = report
+        return report
@@ -0,0 +1,66 @@
+# Process wide cache of rendered figures
+#
+# The charts only change with the location filter (and the dataset or model
+# they are drawn from), so each one is rendered to PNG once per key and later
+# reruns send the cached bytes with st.image without touching matplotlib.
+import io
+import threading
+from collections import OrderedDict
+
+from churn.perf import span
+
+
+def figure_png(fig):
+    """PNG bytes of `fig` with the same options st.pyplot uses."""
+    image = io.BytesIO()
+    fig.savefig(image, format='png', dpi=200, bbox_inches='tight')
+    return image.getvalue()
+
+
+class FigureCache:
+    """LRU cache of PNG bytes bounded by entry count and total size."""
+
+    def __init__(self, max_entries=256, max_bytes=64 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, render):
+        """PNG bytes for `key`, calling render() for a Figure on a miss."""
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return png
+            self.misses += 1
+
+        # Render outside the lock, matplotlib is the slow part
+        with span('figure/render'):
+            fig = render()
+        with span('figure/png'):
+            png = figure_png(fig)
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = png
+                self.nbytes += len(png)
+            while self._entries and (len(self._entries) > self.max_entries or self.nbytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= len(evicted)
+        return png
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+figure_cache = FigureCache()
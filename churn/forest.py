@@ -0,0 +1,251 @@
+# Flat NumPy inference engine for the Random Forest
+#
+# The trees of a fitted scikit-learn forest are exported into one set of
+# flat node arrays (feature, threshold, left, right, value), and every tree
+# is walked at once for the whole batch, one tree level per step. Loading
+# and scoring only need NumPy, and a single row takes microseconds instead
+# of the milliseconds of sklearn's per-call overhead.
+#
+#   python -m churn export-forest                    # random_forest_model.npz
+#   python -m churn serve --model random_forest_model.npz
+#
+# Exports can drop trees, cut the trees at a smaller depth and store the
+# nodes in the smallest dtypes (`python -m churn export-forest --report`
+# shows what each option costs in accuracy). The .npz is uncompressed, so
+# `FlatForest.load` maps its arrays from the page cache instead of reading
+# them: every worker process serving the same file shares one copy.
+import os
+import zipfile
+
+import numpy as np
+
+FOREST_FORMAT = 2
+
+
+def _float32_thresholds(thresholds):
+    """float32 thresholds that split float32 inputs exactly like the float64 ones.
+
+    sklearn casts X to float32 and tests `x <= threshold` in float64. Rounding
+    every threshold down to the nearest float32 keeps that test exact.
+    """
+    rounded = thresholds.astype(np.float32)
+    above = rounded.astype(np.float64) > thresholds
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def _smallest_int(limit):
+    """Smallest signed integer dtype holding every value below `limit`."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if limit <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.int64
+
+
+def _node_depths(tree):
+    """Depth of every node of a fitted sklearn tree; parents come before their children."""
+    depth = np.zeros(tree.node_count, dtype=np.intp)
+    for node in range(tree.node_count):
+        if tree.children_left[node] >= 0:
+            depth[tree.children_left[node]] = depth[tree.children_right[node]] = depth[node] + 1
+    return depth
+
+
+def _mmap_npz(path):
+    """The arrays of an uncompressed .npz, memory mapped from the file."""
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path} is compressed and cannot be memory mapped")
+            # Local file header: 30 bytes, then the name and the extra field
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(f.read(4), dtype='<u2')
+            f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+            version = np.lib.format.read_magic(f)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(f)
+            if dtype.hasobject:
+                raise ValueError(f"{path}: {info.filename} holds Python objects")
+            name = info.filename[:-len('.npy')]
+            if not shape or 0 in shape:
+                # np.memmap cannot map scalars or empty arrays
+                arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays
+
+
+class FlatForest:
+    """A forest of binary trees stored as flat arrays, scored without sklearn.
+
+    Nodes of every tree are concatenated; `roots` holds the first node of each
+    tree. Leaves point to themselves, so a batch can take `depth` steps down
+    every tree without checking which rows already reached a leaf. The left
+    and right child of node i are `children[2*i]` and `children[2*i + 1]`, so
+    each step is one gather. `value` holds the class probabilities of each
+    node.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, depth, classes, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.depth = int(depth)
+        self.classes_ = classes
+        self.n_features_in_ = int(n_features)
+
+    @classmethod
+    def from_sklearn(cls, model, n_trees=None, max_depth=None):
+        """Export a fitted RandomForestClassifier (single output).
+
+        `n_trees` keeps only the first trees of the forest, `max_depth` turns
+        the nodes at that depth into leaves predicting the class shares of
+        their training samples. Without either the export predicts exactly
+        like `model`.
+        """
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise ValueError("Only single output forests can be exported")
+        estimators = model.estimators_[:n_trees]
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        depth = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            keep = np.ones(tree.node_count, dtype=bool)
+            leaf = tree.children_left < 0
+            if max_depth is not None and tree.max_depth > max_depth:
+                depths = _node_depths(tree)
+                keep = depths <= max_depth
+                leaf = leaf | (depths == max_depth)
+            # New number of every kept node; kept nodes keep their order
+            number = np.cumsum(keep) - 1 + offset
+            nodes = np.flatnonzero(keep)
+            leaf = leaf[nodes]
+            left = np.where(leaf, number[nodes], number[tree.children_left[nodes]])
+            right = np.where(leaf, number[nodes], number[tree.children_right[nodes]])
+            features.append(np.where(leaf, 0, tree.feature[nodes]))
+            thresholds.append(np.where(leaf, 0.0, tree.threshold[nodes]))
+            children.append(np.stack([left, right], axis=1).ravel())
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            value = tree.value[nodes, 0, :model.n_classes_].astype(np.float64)
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(value / normalizer)
+            roots.append(offset)
+            offset += len(nodes)
+            depth = max(depth, tree.max_depth if max_depth is None else min(tree.max_depth, max_depth))
+
+        index = np.int32 if offset < 2**30 else np.int64
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=_float32_thresholds(np.concatenate(thresholds)),
+            children=np.concatenate(children).astype(index),
+            value=np.concatenate(values),
+            roots=np.array(roots, dtype=index),
+            depth=depth,
+            classes=np.asarray(model.classes_),
+            n_features=model.n_features_in_,
+        )
+
+    def compact(self):
+        """The same forest in the smallest dtypes.
+
+        Feature and node numbers take the smallest integer type that holds
+        them and the leaf probabilities are stored as float32, which moves
+        the predicted probabilities by about 1e-7.
+        """
+        index = _smallest_int(len(self.feature))
+        return FlatForest(
+            feature=self.feature.astype(_smallest_int(self.n_features_in_)),
+            threshold=self.threshold,
+            children=self.children.astype(index),
+            value=self.value.astype(np.float32),
+            roots=self.roots.astype(index),
+            depth=self.depth,
+            classes=self.classes_,
+            n_features=self.n_features_in_,
+        )
+
+    @property
+    def left(self):
+        return self.children[0::2]
+
+    @property
+    def right(self):
+        return self.children[1::2]
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.feature, self.threshold, self.children, self.value, self.roots))
+
+    def apply(self, X):
+        """Leaf reached in every tree, shape (n_rows, n_trees)."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has shape {X.shape}, expected (n_rows, {self.n_features_in_})")
+        X = np.ascontiguousarray(X).ravel()
+        # Offset of each row in the flattened X
+        rows = np.arange(0, len(X), self.n_features_in_, dtype=np.intp)[:, np.newaxis]
+        nodes = np.broadcast_to(self.roots, (len(rows), self.n_trees))
+        for _ in range(self.depth):
+            x = X[rows + self.feature[nodes]]
+            # Node numbers may be int16 in compact forests, double them as intp
+            nodes = self.children[np.multiply(nodes, 2, dtype=np.intp) + (x > self.threshold[nodes])]
+        return nodes
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        # Summing over the outer axis adds the trees one by one in order,
+        # the same float64 sums as the sklearn forest
+        proba = self.value[leaves.T].sum(axis=0, dtype=np.float64)
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+    def save(self, path, **metadata):
+        """Write an uncompressed .npz atomically.
+
+        Processes may have the old file memory mapped; replacing it keeps
+        their pages valid, overwriting it in place would not.
+        """
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(
+                f, format=FOREST_FORMAT, feature=self.feature, threshold=self.threshold,
+                children=self.children, value=self.value, roots=self.roots,
+                depth=self.depth, classes=self.classes_, n_features=self.n_features_in_,
+                **{f'meta_{key}': value for key, value in metadata.items()},
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a saved forest, memory mapping its arrays unless `mmap` is False."""
+        if mmap:
+            arrays = _mmap_npz(path)
+        else:
+            with np.load(path, allow_pickle=False) as npz:
+                arrays = dict(npz)
+        if int(arrays['format']) != FOREST_FORMAT:
+            raise ValueError(f"{path}: unsupported forest format {int(arrays['format'])}, "
+                             f"export it again with python -m churn export-forest")
+        return cls(
+            arrays['feature'], arrays['threshold'], arrays['children'], arrays['value'],
+            arrays['roots'], arrays['depth'], arrays['classes'], arrays['n_features'],
+        )
+
+    @staticmethod
+    def metadata(path):
+        """The keyword arguments `save` stored next to the arrays."""
+        with np.load(path, allow_pickle=False) as npz:
+            return {name[len('meta_'):]: npz[name][()] for name in npz.files if name.startswith('meta_')}
@@ -0,0 +1,10 @@
+# Content fingerprints used to key caches on the files they were built from
+import hashlib
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,46 @@
+# Location partition index of decdf
+#
+# The rows of every location are found with one stable argsort; the
+# correlation engine adds each partition to the statistics of its location.
+# The locations come from the data, so new cities need no new code paths,
+# only a display name below.
+import numpy as np
+
+from churn.perf import span
+
+# Display names of the Location codes; codes without a name are shown as "Location <code>"
+location_names = {0: 'Jakarta', 1: 'Bandung'}
+
+
+class LocationIndex:
+    """Row positions of a frame per location code."""
+
+    def __init__(self, frame, column='Location'):
+        values = frame[column].to_numpy()
+        order = np.argsort(values, kind='stable')
+        codes, starts, counts = np.unique(values[order], return_index=True, return_counts=True)
+        self.codes = [int(code) for code in codes]
+        # Rows of each location, in their original order
+        self.partitions = {int(code): order[start:start + count] for code, start, count in zip(codes, starts, counts)}
+
+    def name(self, code):
+        return location_names.get(code, f"Location {code}")
+
+    def describe(self, locations):
+        """'Jakarta', 'Jakarta and Bandung', 'Jakarta, Bandung and Surabaya', ..."""
+        names = [self.name(code) for code in locations]
+        return names[0] if len(names) == 1 else ", ".join(names[:-1]) + " and " + names[-1]
+
+
+_last = (None, None)
+
+
+def location_index(frame):
+    """The LocationIndex of `frame`, rebuilt only when a different frame is passed."""
+    global _last
+    indexed, index = _last
+    if indexed is not frame:
+        with span('locations/index'):
+            index = LocationIndex(frame)
+        _last = (frame, index)
+    return index
@@ -0,0 +1,115 @@
+# Lightweight instrumentation
+#
+# `with span('data/read_excel'):` times a block and adds it to the
+# process-wide recorder and, when the calling thread is bound to one, to the
+# recorder of the current dashboard session. Recorders only keep per-name
+# aggregates (count, total, max, last), so spans can stay on in production.
+#
+# The dashboards show the session recorder in the sidebar "Performance"
+# panel; the scoring service exports the process recorder on /metrics.
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+
+class SpanStats:
+    __slots__ = ('count', 'total', 'max', 'last')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.last = seconds
+
+
+class Recorder:
+    """Aggregated timings per span name, safe to share between threads."""
+
+    def __init__(self):
+        self.started = time.time()
+        self._spans = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                stats = self._spans[name] = SpanStats()
+            stats.add(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """One dict per span name, slowest total first."""
+        with self._lock:
+            rows = [
+                {'span': name, 'count': s.count, 'total_s': s.total, 'mean_s': s.total / s.count,
+                 'max_s': s.max, 'last_s': s.last}
+                for name, s in self._spans.items()
+            ]
+        return sorted(rows, key=lambda row: row['total_s'], reverse=True)
+
+    def to_json(self):
+        return json.dumps({'started': self.started, 'spans': self.snapshot()}, indent=1)
+
+    def to_prometheus(self, prefix='churn'):
+        """Prometheus text exposition format, one summary per span name."""
+        rows = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_span_seconds Time spent in instrumented spans.",
+            f"# TYPE {prefix}_span_seconds summary",
+        ]
+        for row in rows:
+            label = _label(row['span'])
+            lines.append(f'{prefix}_span_seconds_count{{span="{label}"}} {row["count"]}')
+            lines.append(f'{prefix}_span_seconds_sum{{span="{label}"}} {row["total_s"]!r}')
+        lines += [
+            f"# HELP {prefix}_span_seconds_max Longest single run of each span.",
+            f"# TYPE {prefix}_span_seconds_max gauge",
+        ]
+        for row in rows:
+            lines.append(f'{prefix}_span_seconds_max{{span="{_label(row["span"])}"}} {row["max_s"]!r}')
+        return "\n".join(lines) + "\n"
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Every span of the process, across sessions and threads
+process_recorder = Recorder()
+
+# Recorder of the dashboard session running in this thread, if any
+_session = contextvars.ContextVar('churn_perf_session', default=None)
+
+
+def bind(recorder):
+    """Send the spans of the calling thread to `recorder` as well."""
+    _session.set(recorder)
+
+
+def record(name, seconds):
+    process_recorder.add(name, seconds)
+    recorder = _session.get()
+    if recorder is not None:
+        recorder.add(name, seconds)
+
+
+@contextmanager
+def span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
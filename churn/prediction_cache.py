@@ -0,0 +1,157 @@
+# Prediction cache keyed on the encoded feature vector
+#
+# Agents submit the same customer profiles over and over, and uploads repeat
+# rows. The class probabilities of every encoded row are kept in a process
+# wide LRU with a time to live, so a repeated row costs a dictionary lookup
+# instead of a walk through every tree. Entries belong to one model hash:
+# the first lookup with another hash (a retrained model) empties the cache.
+#
+# CHURN_PREDICTION_CACHE_SIZE (entries, 0 turns the cache off) and
+# CHURN_PREDICTION_CACHE_TTL (seconds) tune it.
+import os
+import time
+import itertools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+MAX_SIZE = int(os.environ.get('CHURN_PREDICTION_CACHE_SIZE', 50_000))
+TTL = float(os.environ.get('CHURN_PREDICTION_CACHE_TTL', 3600))
+
+
+def row_keys(X):
+    """One bytes key per row of the encoded matrix X."""
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    # +0.0 turns -0.0 into 0.0, the forest does not tell them apart either
+    X = X + 0.0
+    return X.view(np.dtype((np.void, X.shape[1] * X.itemsize))).ravel().tolist()
+
+
+class PredictionCache:
+    """LRU of class probabilities per encoded row, for a single model at a time."""
+
+    def __init__(self, maxsize=MAX_SIZE, ttl=TTL, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.model_sha256 = None
+        # key -> (expiry time, class probabilities), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_model(self, model_sha256):
+        if model_sha256 != self.model_sha256:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.model_sha256 = model_sha256
+
+    def predict_proba(self, model, model_sha256, X, predict=None):
+        """Class probabilities for every row of X, computing only the rows not cached.
+
+        `predict` scores the missing rows (default: model.predict_proba).
+        Rows repeated inside X are predicted once. Misses count the rows that
+        were predicted, hits every other row.
+        """
+        predict = predict or model.predict_proba
+        X = np.asarray(X)
+        proba = np.empty((len(X), len(model.classes_)), dtype=np.float64)
+        if not len(X):
+            return proba
+        if self.maxsize <= 0:
+            proba[:] = predict(X)
+            return proba
+
+        keys = row_keys(X)
+        # Rows served from the cache and their probabilities
+        hit_rows, hit_values = [], []
+        # Position in the predicted rows of every key not in the cache, and
+        # (row, position) of every row that needs one of them
+        missing = {}
+        miss_rows, miss_positions = [], []
+        with self._lock:
+            self._check_model(model_sha256)
+            now = self.clock()
+            entries = self._entries
+            for i, key in enumerate(keys):
+                position = missing.get(key)
+                if position is None:
+                    entry = entries.get(key)
+                    if entry is not None and entry[0] > now:
+                        entries.move_to_end(key)
+                        hit_rows.append(i)
+                        hit_values.append(entry[1])
+                        continue
+                    if entry is not None:
+                        del entries[key]
+                        self.expirations += 1
+                    position = missing[key] = len(missing)
+                miss_rows.append(i)
+                miss_positions.append(position)
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+
+        if hit_rows:
+            proba[hit_rows] = hit_values
+        if missing:
+            firsts = np.empty(len(missing), dtype=np.intp)
+            firsts[miss_positions] = miss_rows
+            predicted = np.asarray(predict(X[firsts]), dtype=np.float64)
+            proba[miss_rows] = predicted[miss_positions]
+            # Only the newest `maxsize` rows would survive the insertion
+            keep = max(len(missing) - self.maxsize, 0)
+            values = predicted[keep:].tolist()
+            with self._lock:
+                # Keep nothing computed by a model that was replaced meanwhile
+                if model_sha256 == self.model_sha256:
+                    expires = self.clock() + self.ttl
+                    entries = self._entries
+                    for key, value in zip(itertools.islice(missing, keep, None), values):
+                        entries[key] = (expires, value)
+                        entries.move_to_end(key)
+                    while len(entries) > self.maxsize:
+                        entries.popitem(last=False)
+                        self.evictions += 1
+        return proba
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_s': self.ttl,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'model_sha256': self.model_sha256,
+            }
+
+    def to_prometheus(self, prefix='churn'):
+        stats = self.stats()
+        lines = []
+        for name, kind, text in (('hits', 'counter', "Rows served from the prediction cache."),
+                                 ('misses', 'counter', "Rows the model had to predict."),
+                                 ('evictions', 'counter', "Entries dropped to stay within the size limit."),
+                                 ('expirations', 'counter', "Entries dropped after their time to live."),
+                                 ('size', 'gauge', "Entries in the prediction cache.")):
+            metric = f"{prefix}_prediction_cache_{name}" + ('_total' if kind == 'counter' else '')
+            lines += [f"# HELP {metric} {text}", f"# TYPE {metric} {kind}", f"{metric} {stats[name]}"]
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every dashboard session, the scoring service and batch scoring
+prediction_cache = PredictionCache()
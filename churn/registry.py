@@ -0,0 +1,153 @@
+# Process wide model registry
+#
+# Streamlit reruns the dashboard script on every interaction, but imported
+# modules stay in memory, so the forest is deserialized once per process and
+# shared by every session. A retrained model file is picked up on the next
+# call without restarting the server.
+#
+# `.npz` files are flat forests exported by `python -m churn export-forest`;
+# they load and score with NumPy alone, memory mapped so that the worker
+# processes of a host share one copy from the page cache. With
+# CHURN_SHARED_DIR set, scikit-learn forests are exported there once and
+# served the same way (see churn.shared). CHURN_MODEL_PATH switches the
+# default model of the dashboards and the commands.
+import os
+import json
+import time
+import pickle
+import threading
+
+import joblib
+import numpy as np
+
+from churn import shared
+from churn.encoding import ENCODER_VERSION, nama_feature
+from churn.hashing import file_sha256
+from churn.perf import span
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SKLEARN_MODEL_PATH = os.path.join(ROOT, 'random_forest_model.joblib')
+FLAT_MODEL_PATH = os.path.join(ROOT, 'random_forest_model.npz')
+MODEL_PATH = os.environ.get('CHURN_MODEL_PATH') or SKLEARN_MODEL_PATH
+
+_lock = threading.Lock()
+_entries = {}
+
+
+class LoadedModel:
+    """A deserialized model together with what it cost to load it."""
+
+    def __init__(self, model, path, sha256, stat, load_seconds, nbytes):
+        self.model = model
+        self.path = path
+        self.sha256 = sha256
+        self.stat = stat
+        self.load_seconds = load_seconds
+        self.nbytes = nbytes
+
+    @property
+    def mtime(self):
+        return self.stat[0]
+
+    def describe(self):
+        return {
+            'path': self.path,
+            'sha256': self.sha256,
+            'mtime': self.mtime,
+            'load_ms': round(self.load_seconds * 1000, 2),
+            'memory_mb': round(self.nbytes / 2**20, 2),
+        }
+
+
+def metadata_path(model_path):
+    """Training metadata written next to a model by `python -m churn train`."""
+    return os.path.splitext(model_path)[0] + '.meta.json'
+
+
+def read_metadata(model_path):
+    try:
+        with open(metadata_path(model_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def check_metadata(path):
+    """Refuse models trained on another feature order or encoding."""
+    metadata = read_metadata(path)
+    if metadata is None:
+        return
+    if metadata.get('encoder_version') != ENCODER_VERSION:
+        raise ValueError(f"{path} was trained with encoder version {metadata.get('encoder_version')}, "
+                         f"this code encodes with version {ENCODER_VERSION}")
+    if metadata.get('features') != nama_feature:
+        raise ValueError(f"{path} was trained on features {metadata.get('features')}")
+
+
+def model_nbytes(model):
+    """Approximate memory held by a model, exact for scikit-learn and flat forests."""
+    if isinstance(getattr(model, 'nbytes', None), int):
+        return model.nbytes
+    estimators = getattr(model, 'estimators_', None)
+    if estimators is not None and all(hasattr(e, 'tree_') for e in estimators):
+        total = 0
+        for estimator in estimators:
+            state = estimator.tree_.__getstate__()
+            total += state['nodes'].nbytes + state['values'].nbytes
+        return total
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+@span('model/load')
+def _load(path, sha256, stat):
+    check_metadata(path)
+    start = time.perf_counter()
+    if path.endswith('.npz'):
+        from churn.forest import FlatForest
+        model = FlatForest.load(path)
+    elif shared.SHARED_DIR:
+        model = shared.shared_model(path, sha256, lambda: joblib.load(path))
+    else:
+        model = joblib.load(path)
+    # Warm start: the first predict call allocates the forest's work buffers
+    if hasattr(model, 'n_features_in_'):
+        model.predict_proba(np.zeros((1, model.n_features_in_)))
+    load_seconds = time.perf_counter() - start
+    return LoadedModel(model, path, sha256, stat, load_seconds, model_nbytes(model))
+
+
+def get_model_entry(path=MODEL_PATH):
+    """Return the cached LoadedModel for `path`, reloading it if the file changed.
+
+    The cheap (mtime, size) stat is checked on every call; the file is only
+    hashed when the stat changed, and only reloaded when the hash changed.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    stat = (st.st_mtime_ns, st.st_size)
+
+    entry = _entries.get(path)
+    if entry is not None and entry.stat == stat:
+        return entry
+
+    with _lock:
+        entry = _entries.get(path)
+        if entry is not None and entry.stat == stat:
+            return entry
+        sha256 = file_sha256(path)
+        if entry is not None and entry.sha256 == sha256:
+            # Touched but not changed
+            entry.stat = stat
+            return entry
+        entry = _load(path, sha256, stat)
+        _entries[path] = entry
+        return entry
+
+
+def load_model(path=MODEL_PATH):
+    return get_model_entry(path).model
+
+
+def clear():
+    with _lock:
+        _entries.clear()
@@ -0,0 +1,176 @@
+# Batch scoring for the Random Forest churn model
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from churn.encoding import feature_encoder
+from churn.perf import span
+from churn.prediction_cache import prediction_cache
+
+prediction_labels = np.array(['No Churn', 'Churn'], dtype=object)
+
+# Rows per predict_proba call, keeps the temporary arrays of the forest bounded
+CHUNK_SIZE = 50_000
+
+# Below this many rows per worker the thread hand-off costs more than it saves
+MIN_ROWS_PER_WORKER = 2_000
+
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def default_workers():
+    """Scoring threads: $CHURN_SCORING_WORKERS, or one per CPU core."""
+    workers = os.environ.get('CHURN_SCORING_WORKERS')
+    if workers:
+        return max(int(workers), 1)
+    return os.cpu_count() or 1
+
+
+def _shared_pool(workers):
+    """The long-lived scoring pool shared by every session, with at least `workers` threads.
+
+    It starts with default_workers() threads and is only replaced by a
+    larger one when a caller asks for more; the old pool finishes its
+    queued chunks and its threads exit.
+    """
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size < workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool_size = max(workers, default_workers())
+            _pool = ThreadPoolExecutor(_pool_size, thread_name_prefix='churn-score')
+        return _pool
+
+
+class BatchResult:
+    """Predictions for every row of a batch plus the rows that could not be scored."""
+
+    def __init__(self, labels, probabilities, errors, scored_rows=0, unique_rows=0):
+        self.labels = labels
+        self.probabilities = probabilities
+        self.errors = errors
+        # Valid rows, and how many distinct feature vectors were among them
+        self.scored_rows = scored_rows
+        self.unique_rows = unique_rows
+
+    @property
+    def n_invalid(self):
+        return int(self.errors['Row'].nunique()) if len(self.errors) else 0
+
+    @property
+    def dedup_ratio(self):
+        """Scored rows per distinct feature vector, 1.0 when every row differs."""
+        return self.scored_rows / self.unique_rows if self.unique_rows else 1.0
+
+
+def encode_frame(frame):
+    """Encode an uploaded table, reporting invalid cells by Excel row number."""
+    X, valid, errors = feature_encoder.encode(frame)
+    # Excel row number, the header is row 1
+    errors = errors.rename(columns={'Index': 'Row'})
+    errors['Row'] = errors['Row'] + 2
+    return X, valid, errors
+
+
+def unique_rows(X):
+    """The distinct rows of X and, for every row of X, the index of its distinct row.
+
+    Every column is factorized and the codes are packed into one int64 key
+    per row, so np.unique sorts integers instead of comparing whole rows.
+    When the codes of all columns do not fit in 63 bits the rows are
+    compared as raw bytes instead.
+    """
+    key = np.zeros(len(X), dtype=np.int64)
+    radix = 1
+    for column in X.T:
+        codes, values = pd.factorize(column)
+        if radix * len(values) >= 2**63:
+            key = np.ascontiguousarray(X).view(np.dtype((np.void, X.shape[1] * X.itemsize))).ravel()
+            break
+        key += codes * radix
+        radix *= len(values)
+    _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+    return X[first], inverse
+
+
+def predict_proba(model, X, chunk_size=CHUNK_SIZE, workers=None):
+    """Class probabilities for every row of X.
+
+    X is cut into chunks of at most `chunk_size` rows, and into at least one
+    chunk per worker, that are scored on a thread pool: the tree traversal
+    of scikit-learn runs without the GIL, so threads use every core without
+    copying the model or the data into other processes. Every chunk writes
+    its own slice of the result, so rows stay in order.
+    """
+    workers = default_workers() if workers is None else max(int(workers), 1)
+    workers = min(workers, max(len(X) // MIN_ROWS_PER_WORKER, 1))
+    chunk_size = max(min(chunk_size, -(-len(X) // workers)), 1)
+
+    proba = np.empty((len(X), len(model.classes_)), dtype=np.float64)
+
+    def score(start):
+        proba[start:start + chunk_size] = model.predict_proba(X[start:start + chunk_size])
+
+    starts = range(0, len(X), chunk_size)
+    workers = min(workers, len(starts))
+    if workers <= 1:
+        for start in starts:
+            score(start)
+    else:
+        # One task per worker, each scoring every workers-th chunk, so a call
+        # never occupies more than `workers` threads of the shared pool
+        def score_every(first):
+            for start in starts[first::workers]:
+                score(start)
+
+        # list() re-raises the first error of any chunk
+        list(_shared_pool(workers).map(score_every, range(workers)))
+    return proba
+
+
+def score_frame(model, frame, chunk_size=CHUNK_SIZE, workers=None, model_sha256=None):
+    """Score a whole uploaded table in one vectorized pass.
+
+    Rows with unknown categories or non numeric values are left out of the
+    prediction and listed together in `BatchResult.errors`. `workers` is the
+    number of scoring threads, see predict_proba.
+
+    Every distinct feature vector is predicted once and its probabilities
+    are copied to all of its rows. With the `model_sha256` of the model the
+    distinct vectors also go through the prediction cache, so vectors seen
+    in earlier chunks or uploads are not predicted again.
+    """
+    with span('score/encode'):
+        X, valid, errors = encode_frame(frame)
+
+    with span('score/dedup'):
+        unique, inverse = unique_rows(X[valid])
+
+    with span('score/predict'):
+        if model_sha256 is None:
+            proba = predict_proba(model, unique, chunk_size, workers)
+        else:
+            proba = prediction_cache.predict_proba(
+                model, model_sha256, unique, lambda X: predict_proba(model, X, chunk_size, workers))
+        proba = proba[inverse]
+
+    probabilities = np.full(len(frame), np.nan)
+    probabilities[valid] = proba[:, list(model.classes_).index(1)]
+
+    labels = np.full(len(frame), 'Invalid', dtype=object)
+    # Same decision as model.predict: argmax over the classes
+    labels[valid] = prediction_labels[model.classes_[proba.argmax(axis=1)]]
+
+    return BatchResult(
+        pd.Series(labels, index=frame.index, name='Prediction Result'),
+        pd.Series(probabilities, index=frame.index, name='Churn Probability'),
+        errors,
+        scored_rows=len(inverse),
+        unique_rows=len(unique),
+    )
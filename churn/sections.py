@@ -0,0 +1,102 @@
+# Declarative spec of the "Analysis Result" sections
+#
+# Every section compares churn across the values of one feature: a count
+# plot of all values, a pie per value and the correlation heatmap of the
+# one-hot columns. A section is only data; ui.render_sections draws any
+# list of them from the shared churn cube and figure cache, so adding a
+# feature is one more entry here.
+from churn.encoding import feature_encoder
+
+
+class Section:
+    """One feature of the analysis with the texts shown around its charts."""
+
+    def __init__(self, feature, title, caption, pie_tabs, correlation_title=None):
+        self.feature = feature
+        self.title = title
+        self.caption = caption
+        # (value label, tab label) of every value that gets a pie
+        self.pie_tabs = pie_tabs
+        self.correlation_title = correlation_title
+
+    @property
+    def tick_labels(self):
+        # Count plot bars follow the order of the encoded values
+        return feature_encoder.categories[self.feature]
+
+    @property
+    def pie_values(self):
+        return [int(feature_encoder.encode_value(self.feature, label)) for label, _ in self.pie_tabs]
+
+    @property
+    def correlation_columns(self):
+        return [f'{self.feature}_{label}' for label, _ in self.pie_tabs] + ['Churn Label_No', 'Churn Label_Yes']
+
+    @property
+    def tab_labels(self):
+        return ["[Comparison]"] + [tab for _, tab in self.pie_tabs] + ["[Correlation]"]
+
+    def figures(self, cube, correlations, locations):
+        """(cache key, render) of the figure in every tab, in tab order.
+
+        Counts come from the churn cube and correlations from the
+        CorrelationEngine, both for the selected locations only.
+        """
+        from churn.charts import churn_countplot, churn_pie, correlation_heatmap
+
+        feature = self.feature
+        figures = [((feature, 'Count Plot'),
+                    lambda: churn_countplot(cube.counts(feature, locations), feature, self.tick_labels))]
+        for value in self.pie_values:
+            figures.append(((feature, 'Pie', value),
+                            lambda value=value: churn_pie(cube.churn_counts(feature, value, locations))))
+        figures.append(((feature, 'Correlation'),
+                        lambda: correlation_heatmap(correlations.matrix(locations, self.correlation_columns),
+                                                    self.correlation_columns, title=self.correlation_title)))
+        return figures
+
+    @property
+    def anchor(self):
+        # Streamlit's anchor for a subheader
+        return self.title.lower().replace(' ', '-')
+
+
+def _uses(feature, title, caption, name=None, **kwargs):
+    name = name or feature
+    return Section(feature, title, caption,
+                   [('No', f"[Does Not Use {name}]"), ('Yes', f"[Use {name}]")], **kwargs)
+
+
+sections = [
+    _uses(
+        'Call Center', "Call Center Comparison",
+        "It can be seen from the display data, that the service of the call center is not the cause of customers leaving the company, even when customers use call center services, it can reduce the number of customers leaving the company.",
+    ),
+    _uses(
+        'Games Product', "Games Product Uses Comparison",
+        "It can be seen from the display data, that customers who use internet services on games product tend to have a significantly higher level of loyalty to the company than customers who do not use it as internet services on games product, so it can be estimated that customers are very satisfied with internet services in the use of games product.",
+    ),
+    _uses(
+        'Music Product', "Music Product Uses Comparison",
+        "It can be seen from the display data, that customers who use internet services for music products have the most customers, so it can be estimated that for now, customers are quite satisfied with internet services and it can be said that the purpose of customers using internet services at the company is to use the music product.",
+    ),
+    _uses(
+        'Education Product', "Education Product Uses Comparison",
+        "It can be seen from the display data that customers who use internet service for educational products are among those who do not have a significant impact on churn rates.",
+    ),
+    _uses(
+        'Use MyApp', "Use MyApp Uses Comparison",
+        "It can be seen from the display data, that customers who use internet service for Use MyApp, have the most impact on customers changing internet companies, so it is necessary to improve service to customers.",
+        name='MyApp',
+    ),
+    _uses(
+        'Video Product', "Video Product Uses Comparison",
+        "Just like customers who use myapp, customers who use internet service for video  have a strong impact that can make customers leave the company, so it is necessary to improve connection stream between majority video streaming platform.",
+        correlation_title="Grafik Korelasi",
+    ),
+    Section(
+        'Payment Method', "Payment Method Comparison",
+        "When viewed from each data, customers with pulsa payment methods have the highest impact on leaving the company.",
+        [(label, f"[By {label}]") for label in feature_encoder.categories['Payment Method']],
+    ),
+]
@@ -0,0 +1,258 @@
+# Headless HTTP scoring service
+#
+# A plain ASGI application, so it runs under any ASGI server (uvicorn,
+# hypercorn, ...) without a web framework and without the plotting stack
+# the dashboards pull in. Concurrent requests are queued and scored
+# together: one encode pass and one predict_proba call per micro-batch.
+#
+#   pip install uvicorn
+#   python -m churn serve --port 8000
+#
+#   POST /predict  {"Tenure Months": 1, "Device Class": "Low", ...}
+#   POST /predict  {"customers": [{...}, {...}]}
+#   GET  /health
+#   GET  /metrics  Prometheus text of the instrumentation spans and the prediction cache
+import json
+import asyncio
+
+import numpy as np
+
+from churn import registry
+from churn.encoding import MissingColumnsError, feature_encoder
+from churn.perf import process_recorder, span
+from churn.prediction_cache import prediction_cache
+from churn.scoring import predict_proba, prediction_labels
+
+# A micro-batch is closed after this many customers or this many seconds
+MAX_BATCH_SIZE = 4096
+MAX_BATCH_WAIT = 0.002
+
+
+class RequestError(ValueError):
+    pass
+
+
+def parse_customers(body):
+    """List of customer records from a single or batch JSON payload."""
+    try:
+        payload = json.loads(body or b'null')
+    except ValueError as e:
+        raise RequestError(f"Invalid JSON: {e}")
+    if isinstance(payload, dict) and 'customers' in payload:
+        payload = payload['customers']
+    if isinstance(payload, dict):
+        return [payload], True
+    if isinstance(payload, list) and all(isinstance(record, dict) for record in payload):
+        return payload, False
+    raise RequestError("Expected a customer object, a list of them or {\"customers\": [...]}")
+
+
+class MicroBatcher:
+    """Collects the customers of concurrent requests and scores them together."""
+
+    def __init__(self, model_path=registry.MODEL_PATH, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_BATCH_WAIT):
+        self.model_path = model_path
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.customers = 0
+        self._queue = None
+        self._worker = None
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def score(self, records):
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((records, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self._queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            try:
+                # The forest releases the GIL, keep the event loop free meanwhile
+                results = await loop.run_in_executor(None, self._score_batch, [records for records, _ in pending])
+            except Exception as e:
+                if len(pending) == 1:
+                    results = [e]
+                else:
+                    # Score the requests one by one so only the failing one gets the error
+                    results = []
+                    for records, _ in pending:
+                        try:
+                            results += await loop.run_in_executor(None, self._score_batch, [records])
+                        except Exception as e:
+                            results.append(e)
+            for (_, future), result in zip(pending, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    @span('service/batch')
+    def _score_batch(self, requests):
+        entry = registry.get_model_entry(self.model_path)
+        records = [record for records in requests for record in records]
+        try:
+            X, valid, errors = feature_encoder.encode(records)
+        except MissingColumnsError as e:
+            # Nobody in the batch sent these features, report them per customer
+            complete = [{**{column: None for column in e.columns}, **record} for record in records]
+            X, valid, errors = feature_encoder.encode(complete)
+        proba = np.full((len(records), len(entry.model.classes_)), np.nan)
+        if valid.any():
+            proba[valid] = prediction_cache.predict_proba(
+                entry.model, entry.sha256, X[valid], lambda X: predict_proba(entry.model, X))
+        churn = proba[:, list(entry.model.classes_).index(1)]
+        self.batches += 1
+        self.customers += len(records)
+
+        # Position of every invalid cell inside the combined batch
+        error_rows = errors['Index'].to_numpy()
+        results = []
+        start = 0
+        for records in requests:
+            stop = start + len(records)
+            in_request = (error_rows >= start) & (error_rows < stop)
+            results.append({
+                'model_sha256': entry.sha256,
+                'predictions': [
+                    {
+                        'prediction': prediction_labels[entry.model.classes_[proba[i].argmax()]],
+                        'churn_probability': float(churn[i]),
+                    } if valid[i] else None
+                    for i in range(start, stop)
+                ],
+                'errors': [
+                    {'index': int(row - start), 'column': column, 'value': _jsonable(value)}
+                    for row, column, value in zip(error_rows[in_request],
+                                                  errors['Column'].to_numpy()[in_request],
+                                                  errors['Value'].to_numpy()[in_request])
+                ],
+            })
+            start = stop
+        return results
+
+
+def _jsonable(value):
+    if isinstance(value, (float, np.floating)) and not np.isfinite(value):
+        # JSON has no NaN or Infinity
+        return None if np.isnan(value) else str(value)
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class ScoringApp:
+    """ASGI application exposing /predict and /health."""
+
+    def __init__(self, batcher=None):
+        self.batcher = batcher or MicroBatcher()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        method, path = scope['method'], scope['path'].rstrip('/')
+        if path == '/health' and method == 'GET':
+            entry = registry.get_model_entry(self.batcher.model_path)
+            await _respond(send, 200, {
+                'status': 'ok',
+                'model': entry.describe(),
+                'batches': self.batcher.batches,
+                'customers': self.batcher.customers,
+                'prediction_cache': prediction_cache.stats(),
+            })
+        elif path == '/metrics' and method == 'GET':
+            metrics = process_recorder.to_prometheus() + prediction_cache.to_prometheus()
+            await _respond_text(send, 200, metrics, b'text/plain; version=0.0.4')
+        elif path == '/predict' and method == 'POST':
+            await self._predict(await _read_body(receive), send)
+        else:
+            await _respond(send, 404, {'error': 'Not found'})
+
+    async def _predict(self, body, send):
+        try:
+            records, single = parse_customers(body)
+        except RequestError as e:
+            await _respond(send, 400, {'error': str(e)})
+            return
+        if not records:
+            await _respond(send, 200, {'predictions': [], 'errors': []})
+            return
+
+        try:
+            result = await self.batcher.score(records)
+        except Exception as e:
+            await _respond(send, 500, {'error': f"Scoring failed: {e}"})
+            return
+        status = 422 if result['errors'] else 200
+        if single:
+            result = {
+                'model_sha256': result['model_sha256'],
+                'prediction': result['predictions'][0],
+                'errors': result['errors'],
+            }
+        await _respond(send, status, result)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    # Warm start before accepting traffic
+                    registry.get_model_entry(self.batcher.model_path)
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _respond(send, status, payload):
+    await _respond_text(send, status, json.dumps(payload), b'application/json')
+
+
+async def _respond_text(send, status, text, content_type):
+    body = text.encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+app = ScoringApp()
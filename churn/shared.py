@@ -0,0 +1,153 @@
+# Dataset and model arrays shared between dashboard processes
+#
+# With CHURN_SHARED_DIR set, ideally to a tmpfs such as /dev/shm/churn, the
+# first process that loads a dataset writes every column as a .npy file and
+# the first that loads a scikit-learn forest exports it as a flat forest.
+# All processes then memory map those files read-only, so the arrays live
+# once in the page cache however many Streamlit workers run on the host:
+#
+#   CHURN_SHARED_DIR=/dev/shm/churn python -m churn share      # optional, before starting the workers
+#   CHURN_SHARED_DIR=/dev/shm/churn streamlit run dashboard.py
+#
+# Files are named after the sha256 of their source, so a changed source is
+# published next to the old one, which is removed once the new one is in
+# place. Processes still mapping the old files keep their pages until they
+# reload.
+import os
+import json
+import glob
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from churn.perf import span
+
+SHARED_DIR = os.environ.get('CHURN_SHARED_DIR') or None
+
+# Bumped when the layout of a published frame changes
+SHARED_FORMAT = 2
+
+
+def _store(directory, source, sha256):
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(directory, f'{name}-{sha256[:16]}')
+
+
+def _remove_older(store):
+    """Delete the other versions of the same source; mapped pages stay valid."""
+    prefix = store.rsplit('-', 1)[0]
+    suffix = '.npz' if store.endswith('.npz') else ''
+    for other in glob.glob(glob.escape(prefix) + '-' + '?' * 16 + suffix):
+        if other != store:
+            if os.path.isdir(other):
+                shutil.rmtree(other, ignore_errors=True)
+            else:
+                try:
+                    os.remove(other)
+                except OSError:
+                    pass
+
+
+def publish_frame(df, store):
+    """Write the columns of `df` as .npy files into the directory `store`."""
+    arrays = [df[column].to_numpy() for column in df.columns]
+    for column, values in zip(df.columns, arrays):
+        if values.dtype.hasobject:
+            raise ValueError(f"Column {column!r} holds Python objects and cannot be shared")
+    index = None
+    if not df.index.equals(pd.RangeIndex(len(df))):
+        if df.index.nlevels > 1:
+            raise ValueError("A MultiIndex cannot be shared")
+        index = df.index.to_numpy()
+        if index.dtype.hasobject:
+            if not all(isinstance(label, str) for label in index):
+                raise ValueError("Index labels hold Python objects and cannot be shared")
+            index = index.astype(str)
+
+    tmp = f"{store}.{os.getpid()}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+    for i, values in enumerate(arrays):
+        np.save(os.path.join(tmp, f'{i}.npy'), values, allow_pickle=False)
+    if index is not None:
+        np.save(os.path.join(tmp, 'index.npy'), index, allow_pickle=False)
+    with open(os.path.join(tmp, 'frame.json'), 'w') as f:
+        json.dump({'format': SHARED_FORMAT, 'columns': list(df.columns), 'rows': len(df),
+                   'index': index is not None, 'index_name': df.index.name}, f)
+    try:
+        os.rename(tmp, store)
+    except OSError:
+        # Another process published the same version first
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(store):
+            raise
+    _remove_older(store)
+
+
+def attach_frame(store):
+    """The published frame in `store` with read-only memory mapped columns, or None."""
+    try:
+        with open(os.path.join(store, 'frame.json')) as f:
+            layout = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if layout.get('format') != SHARED_FORMAT:
+        return None
+    columns = {
+        column: np.load(os.path.join(store, f'{i}.npy'), mmap_mode='r', allow_pickle=False)
+        for i, column in enumerate(layout['columns'])
+    }
+    index = None
+    if layout.get('index'):
+        # Labels are small, they are read into memory
+        index = pd.Index(np.load(os.path.join(store, 'index.npy'), allow_pickle=False), name=layout.get('index_name'))
+        if index.dtype.kind == 'U':
+            index = index.astype(object)
+    # copy=False keeps one block per mapped column instead of consolidating them
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def shared_frame(source, sha256, load, directory=None):
+    """The frame of `source` mapped from the shared directory; `load()` builds it when it is not published yet."""
+    store = _store(directory or SHARED_DIR, source, sha256)
+    df = attach_frame(store)
+    if df is None:
+        df = load()
+        try:
+            with span('shared/publish'):
+                os.makedirs(os.path.dirname(store), exist_ok=True)
+                publish_frame(df, store)
+        except (OSError, ValueError):
+            # Not writable or not shareable, this process keeps its private copy
+            return df
+        # None when a store of an older format is in the way
+        shared = attach_frame(store)
+        if shared is not None:
+            df = shared
+    return df
+
+
+def shared_model(path, sha256, load, directory=None):
+    """A flat forest export of the scikit-learn forest at `path`, mapped from the shared directory.
+
+    `load()` deserializes the model when it has not been exported yet.
+    Models that cannot be exported are returned as loaded.
+    """
+    from churn.forest import FlatForest
+
+    export = _store(directory or SHARED_DIR, path, sha256) + '.npz'
+    if not os.path.exists(export):
+        model = load()
+        try:
+            forest = FlatForest.from_sklearn(model)
+        except (AttributeError, ValueError):
+            return model
+        try:
+            with span('shared/publish'):
+                os.makedirs(os.path.dirname(export), exist_ok=True)
+                forest.save(export, source_sha256=sha256)
+        except OSError:
+            return forest
+        _remove_older(export)
+    return FlatForest.load(export, mmap=True)
+
@@ -0,0 +1,61 @@
+# Import-time budget of the dashboards
+#
+# Streamlit runs the top-level imports of a dashboard before the first
+# element reaches the browser, so they make up most of a cold start. The
+# check runs those imports in a fresh interpreter and fails when they pull in
+# one of HEAVY_MODULES (which belong inside the sections that need them) or
+# take longer than the budget.
+#
+#   python -m churn import-budget --budget 1.5
+import os
+import ast
+import sys
+import json
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DASHBOARDS = [os.path.join(ROOT, 'dashboard.py'), os.path.join(ROOT, 'dashboard_with_upload_excel.py')]
+
+# Plotting, statistics and training code, only imported on demand
+HEAVY_MODULES = ('matplotlib', 'seaborn', 'scipy', 'sklearn')
+
+# Seconds allowed for the top-level imports of one dashboard
+DEFAULT_BUDGET = 1.5
+
+_MEASURE = '''
+import sys, json, time
+start = time.perf_counter()
+exec(compile({source!r}, {script!r}, 'exec'))
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'modules': sorted({{name.split('.')[0] for name in sys.modules}})}}))
+'''
+
+
+def top_level_imports(script):
+    """Source of the import statements at module level of `script`."""
+    with open(script, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), script)
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def measure_imports(script, repeats=3):
+    """Best time of `repeats` cold imports of `script` and the modules they load."""
+    code = _MEASURE.format(source=top_level_imports(script), script=script)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    best = None
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        measured = json.loads(output.strip().splitlines()[-1])
+        if best is None or measured['seconds'] < best['seconds']:
+            best = measured
+    return best['seconds'], [name for name in HEAVY_MODULES if name in best['modules']]
+
+
+def check_budget(scripts=DASHBOARDS, budget=DEFAULT_BUDGET, repeats=3):
+    """(script, seconds, heavy modules, ok) for every script."""
+    results = []
+    for script in scripts:
+        seconds, heavy = measure_imports(script, repeats)
+        results.append((script, seconds, heavy, seconds <= budget and not heavy))
+    return results
@@ -0,0 +1,310 @@
+# Streaming batch scoring for very large uploads
+#
+# The upload is read in fixed-size chunks (openpyxl read-only mode for xlsx,
+# pandas chunksize for CSV, row batches for Parquet), every chunk is scored
+# and appended to the output file, and only a small preview and the first
+# invalid rows are kept in memory. Peak memory follows the chunk size, not
+# the size of the input.
+#
+# Every chunk is indexed by the row numbers of the source, counting the
+# header as row 1 like Excel does, so invalid cells are reported at their
+# real row even when blank rows were skipped.
+import os
+import time
+import queue
+import threading
+
+import pandas as pd
+
+from churn.perf import record
+from churn.scoring import score_frame
+
+CHUNK_ROWS = 50_000
+
+# Rows of the result kept in memory for display
+PREVIEW_ROWS = 1_000
+
+# Invalid cells kept in memory, the rest are only counted
+MAX_ERRORS = 1_000
+
+# Largest gzip compressed result the dashboard offers for download; Streamlit
+# keeps a download in memory for the session, bigger results are scored with
+# `python -m churn score` instead
+MAX_DOWNLOAD_BYTES = 25 * 2**20
+
+
+def file_kind(name):
+    ext = os.path.splitext(name or '')[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.xlsx', '.xlsm'):
+        return 'xlsx'
+    if ext == '.xls':
+        return 'xls'
+    if ext in ('.parquet', '.pq'):
+        return 'parquet'
+    raise ValueError(f"Unsupported file type: {name}")
+
+
+def _source_size(source):
+    if hasattr(source, 'seek') and hasattr(source, 'tell'):
+        position = source.tell()
+        source.seek(0, os.SEEK_END)
+        size = source.tell()
+        source.seek(position)
+        return size
+    return os.path.getsize(source)
+
+
+def iter_csv(source, chunk_size=CHUNK_ROWS):
+    if not hasattr(source, 'read'):
+        with open(source, 'rb') as f:
+            yield from iter_csv(f, chunk_size)
+        return
+    size = _source_size(source) or 1
+    # Blank lines are read as empty rows and dropped here, so the index keeps counting them
+    for chunk in pd.read_csv(source, chunksize=chunk_size, skip_blank_lines=False):
+        chunk.index = chunk.index + 2
+        chunk = chunk.dropna(how='all')
+        # Bytes consumed so far, pandas reads ahead so this is an estimate
+        yield None, chunk, min(source.tell() / size, 1.0)
+
+
+def iter_xlsx(source, chunk_size=CHUNK_ROWS):
+    """Chunks of every sheet of a workbook, read row by row in read-only mode."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheets = workbook.worksheets
+        for index, sheet in enumerate(sheets):
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            header = [str(column) if column is not None else f"Unnamed: {j}" for j, column in enumerate(header)]
+            total = sheet.max_row or 0
+
+            # Buffered rows and their row numbers in the sheet
+            buffer, numbers = [], []
+            read = 1
+            for row in rows:
+                read += 1
+                if all(value is None for value in row):
+                    continue
+                buffer.append(row[:len(header)] + (None,) * (len(header) - len(row)))
+                numbers.append(read)
+                if len(buffer) == chunk_size:
+                    yield sheet.title, pd.DataFrame(buffer, columns=header, index=numbers), _progress(index, len(sheets), read, total)
+                    buffer, numbers = [], []
+            if buffer:
+                yield sheet.title, pd.DataFrame(buffer, columns=header, index=numbers), _progress(index, len(sheets), read, total)
+    finally:
+        workbook.close()
+
+
+def iter_parquet(source, chunk_size=CHUNK_ROWS):
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(source)
+    total = parquet.metadata.num_rows or 1
+    read = 0
+    for batch in parquet.iter_batches(batch_size=chunk_size):
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(read + 2, read + 2 + len(chunk))
+        read += len(chunk)
+        yield None, chunk, min(read / total, 1.0)
+
+
+def _progress(sheet_index, n_sheets, read, total):
+    within = min(read / total, 1.0) if total else 1.0
+    return (sheet_index + within) / n_sheets
+
+
+def iter_chunks(source, name=None, chunk_size=CHUNK_ROWS):
+    """(sheet, chunk, fraction done) for an uploaded file or a path."""
+    kind = file_kind(name or getattr(source, 'name', None) or source)
+    if kind == 'csv':
+        yield from iter_csv(source, chunk_size)
+    elif kind == 'xlsx':
+        yield from iter_xlsx(source, chunk_size)
+    elif kind == 'parquet':
+        yield from iter_parquet(source, chunk_size)
+    else:
+        # Legacy .xls has no streaming reader, it is read in one piece
+        chunk = pd.read_excel(source)
+        chunk.index = pd.RangeIndex(2, 2 + len(chunk))
+        yield None, chunk, 1.0
+
+
+def prefetch(chunks, depth=1):
+    """Read the next `depth` chunks on a background thread while one is scored."""
+    items = queue.Queue(maxsize=depth)
+    done = object()
+
+    def read():
+        try:
+            for item in chunks:
+                items.put(item)
+        except BaseException as e:
+            items.put(e)
+        else:
+            items.put(done)
+
+    threading.Thread(target=read, name='churn-prefetch', daemon=True).start()
+    while True:
+        item = items.get()
+        if item is done:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+class CsvWriter:
+    """Appends scored chunks to a CSV path or text file object."""
+
+    def __init__(self, output):
+        self.output = output
+        self.header_written = False
+
+    def write(self, chunk):
+        chunk.to_csv(self.output, mode='a' if self.header_written else 'w', header=not self.header_written, index=False)
+        self.header_written = True
+
+    def close(self):
+        pass
+
+
+class ParquetWriter:
+    """Appends scored chunks as row groups of one Parquet file.
+
+    The input columns are written as text: their dtype depends on the values
+    of each chunk (one invalid cell turns a numeric column into objects), so
+    only text gives every row group the same schema. Columns in `dtypes`
+    keep the given type.
+    """
+
+    def __init__(self, path, dtypes=None):
+        self.path = path
+        self.dtypes = {'Churn Probability': 'float64'} if dtypes is None else dtypes
+        self.writer = None
+
+    def write(self, chunk):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        chunk = chunk.astype({column: self.dtypes.get(column, 'string') for column in chunk.columns})
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        elif table.schema != self.writer.schema:
+            # Same types, only the pandas metadata differs
+            table = table.cast(self.writer.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def output_kind(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.parquet', '.pq'):
+        return 'parquet'
+    if ext == '.csv':
+        return 'csv'
+    raise ValueError(f"Unsupported output type: {path}")
+
+
+def open_writer(path):
+    """CsvWriter or ParquetWriter depending on the extension of `path`."""
+    return ParquetWriter(path) if output_kind(path) == 'parquet' else CsvWriter(path)
+
+
+class StreamResult:
+    """Summary of a streamed batch: counts, a preview and the first errors."""
+
+    def __init__(self):
+        self.rows = 0
+        self.invalid_rows = 0
+        # Valid rows and distinct feature vectors, summed over the chunks
+        self.scored_rows = 0
+        self.unique_rows = 0
+        self.invalid_cells = 0
+        self.preview = None
+        self.errors = []
+        # Wall clock seconds spent reading, scoring and writing
+        self.read_seconds = 0.0
+        self.score_seconds = 0.0
+        self.write_seconds = 0.0
+        # (rows, seconds) of score_frame for every chunk
+        self.chunk_timings = []
+
+    @property
+    def dedup_ratio(self):
+        """Scored rows per predicted feature vector; duplicates are only found inside a chunk."""
+        return self.scored_rows / self.unique_rows if self.unique_rows else 1.0
+
+    @property
+    def error_frame(self):
+        if not self.errors:
+            return pd.DataFrame(columns=['Sheet', 'Row', 'Column', 'Value'])
+        return pd.concat(self.errors, ignore_index=True)
+
+
+def score_stream(model, chunks, output, progress=None, workers=None, model_sha256=None):
+    """Score `chunks` from iter_chunks and append the results to `output`.
+
+    `output` is a writer from open_writer, or a path or text file object that
+    gets CSV. `progress(fraction, rows)` is called after every chunk.
+    `workers` and `model_sha256` are passed on to score_frame.
+    """
+    result = StreamResult()
+    writer = output if isinstance(output, (CsvWriter, ParquetWriter)) else CsvWriter(output)
+
+    chunks = iter(chunks)
+    while True:
+        start = time.perf_counter()
+        item = next(chunks, None)
+        seconds = time.perf_counter() - start
+        result.read_seconds += seconds
+        record('stream/read', seconds)
+        if item is None:
+            break
+        sheet, chunk, done = item
+
+        start = time.perf_counter()
+        batch = score_frame(model, chunk, workers=workers, model_sha256=model_sha256)
+        seconds = time.perf_counter() - start
+        result.score_seconds += seconds
+        result.chunk_timings.append((len(chunk), seconds))
+
+        chunk.insert(0, 'Prediction Result', batch.labels)
+        chunk.insert(1, 'Churn Probability', batch.probabilities)
+        if sheet is not None:
+            chunk.insert(0, 'Sheet', sheet)
+        start = time.perf_counter()
+        writer.write(chunk)
+        seconds = time.perf_counter() - start
+        result.write_seconds += seconds
+        record('stream/write', seconds)
+
+        result.rows += len(chunk)
+        result.invalid_rows += batch.n_invalid
+        result.scored_rows += batch.scored_rows
+        result.unique_rows += batch.unique_rows
+        result.invalid_cells += len(batch.errors)
+        kept = sum(len(errors) for errors in result.errors)
+        if len(batch.errors) and kept < MAX_ERRORS:
+            errors = batch.errors.head(MAX_ERRORS - kept).copy()
+            # score_frame numbers rows by position, the chunk index holds the source rows
+            errors['Row'] = chunk.index.to_numpy()[errors['Row'].to_numpy() - 2]
+            errors.insert(0, 'Sheet', sheet)
+            result.errors.append(errors)
+        if result.preview is None:
+            result.preview = chunk.head(PREVIEW_ROWS)
+
+        if progress is not None:
+            progress(done, result.rows)
+    return result
@@ -0,0 +1,164 @@
+# Reproducible training of the Random Forest churn model
+#
+# The model is searched with successive halving over random candidates: all
+# candidates start on a small share of the training rows, and only the best
+# third of each round goes on with three times as many rows. The search runs
+# its cross-validation fits on every core, so the wall-clock time is bounded
+# by the number of candidates and rounds rather than by the grid size.
+#
+#   python -m churn train                      # models/random_forest_model-<timestamp>.joblib
+#   python -m churn train --promote            # ... and serve it from random_forest_model.joblib
+#
+# Every artifact gets a .meta.json next to it with the feature order, the
+# encoder version, the chosen parameters, the metrics and the training time.
+import os
+import json
+import time
+import shutil
+import platform
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+
+from churn.encoding import ENCODER_VERSION, nama_feature
+from churn.perf import span
+from churn.registry import metadata_path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.path.join(ROOT, 'models')
+
+# Bumped when the metadata layout changes
+METADATA_VERSION = 1
+
+RANDOM_STATE = 42
+
+# Candidate hyperparameters of the forest, sampled by the search
+search_space = {
+    'n_estimators': [50, 100, 200, 300],
+    'max_depth': [6, 8, 10, 12, 16, None],
+    'min_samples_split': [2, 5, 10, 20],
+    'min_samples_leaf': [1, 2, 4, 8],
+    'max_features': ['sqrt', 'log2', 0.5],
+    'class_weight': ['balanced', 'balanced_subsample', None],
+}
+
+# Parameters of the shipped random_forest_model.joblib, always a candidate
+shipped_params = {'n_estimators': 50, 'max_depth': 10, 'min_samples_split': 10, 'class_weight': 'balanced'}
+
+
+def search(X, y, n_candidates=60, factor=3, cv=5, scoring='roc_auc', n_jobs=-1, random_state=RANDOM_STATE):
+    """Fitted HalvingRandomSearchCV over `search_space`."""
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import HalvingRandomSearchCV, StratifiedKFold
+
+    # One core per forest, the search itself spreads the fits over all cores
+    forest = RandomForestClassifier(random_state=random_state, n_jobs=1)
+    candidates = HalvingRandomSearchCV(
+        forest, search_space, n_candidates=n_candidates, factor=factor,
+        # The last round uses every row; the default 20 rows of the first
+        # round leave folds with a single class and NaN scores
+        min_resources='exhaust',
+        cv=StratifiedKFold(cv, shuffle=True, random_state=random_state), scoring=scoring,
+        refit=True, n_jobs=n_jobs, random_state=random_state,
+    )
+    return candidates.fit(X, y)
+
+
+def train(decdf, n_candidates=60, factor=3, cv=5, scoring='roc_auc', n_jobs=-1):
+    """Search, refit and evaluate a forest on the same split as the evaluation report.
+
+    Returns the fitted model, its metadata (without the artifact hash) and
+    the evaluation report.
+    """
+    import sklearn
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import cross_val_score, StratifiedKFold
+    from churn.evaluation import evaluate, split_dataset
+
+    X_train, X_test, y_train, y_test = split_dataset(decdf)
+
+    start = time.perf_counter()
+    with span('training/search'):
+        result = search(X_train, y_train, n_candidates, factor, cv, scoring, n_jobs)
+    search_seconds = time.perf_counter() - start
+
+    # The shipped parameters only compete on the full training set
+    best_params, best_score = result.best_params_, float(result.best_score_)
+    folds = StratifiedKFold(cv, shuffle=True, random_state=RANDOM_STATE)
+    shipped = RandomForestClassifier(**shipped_params, random_state=RANDOM_STATE, n_jobs=1)
+    shipped_score = float(np.mean(cross_val_score(shipped, X_train, y_train, cv=folds, scoring=scoring, n_jobs=n_jobs)))
+    if shipped_score > best_score:
+        best_params, best_score = dict(shipped_params), shipped_score
+
+    start = time.perf_counter()
+    with span('training/refit'):
+        model = RandomForestClassifier(**best_params, random_state=RANDOM_STATE).fit(X_train, y_train)
+    refit_seconds = time.perf_counter() - start
+
+    report = evaluate(model, decdf)
+    metadata = {
+        'version': METADATA_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'features': list(nama_feature),
+        'encoder_version': ENCODER_VERSION,
+        'classes': [int(c) for c in model.classes_],
+        'params': best_params,
+        'random_state': RANDOM_STATE,
+        'search': {
+            'method': 'HalvingRandomSearchCV',
+            'scoring': scoring,
+            'cv': cv,
+            'factor': factor,
+            'n_candidates': n_candidates,
+            'n_iterations': int(result.n_iterations_),
+            'best_cv_score': best_score,
+            'shipped_cv_score': shipped_score,
+        },
+        'metrics': {'train': report['train'], 'test': report['test']},
+        'training_seconds': {'search': search_seconds, 'refit': refit_seconds},
+        'environment': {
+            'python': platform.python_version(),
+            'sklearn': sklearn.__version__,
+            'cpus': os.cpu_count(),
+        },
+    }
+    return model, metadata, report
+
+
+def save(model, metadata, path):
+    """Write the model and its .meta.json, each atomically."""
+    from churn.hashing import file_sha256
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(model, tmp)
+    os.replace(tmp, path)
+
+    metadata = dict(metadata, model_sha256=file_sha256(path))
+    tmp = f"{metadata_path(path)}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp, metadata_path(path))
+    return metadata
+
+
+def versioned_path(directory=MODELS_DIR, name='random_forest_model'):
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+    return os.path.join(directory, f'{name}-{stamp}.joblib')
+
+
+def promote(path, target):
+    """Serve the artifact at `path` from `target`; running dashboards pick it up on their next rerun."""
+    from churn.evaluation import report_path
+
+    # Metadata and report first, the registry reloads as soon as the model changes
+    for source, destination in ((metadata_path(path), metadata_path(target)),
+                                (report_path(path), report_path(target)),
+                                (path, target)):
+        if not os.path.exists(source):
+            continue
+        tmp = f"{destination}.{os.getpid()}.tmp"
+        shutil.copyfile(source, tmp)
+        os.replace(tmp, destination)
@@ -0,0 +1,78 @@
+# Streamlit layout helpers shared by the dashboards
+import time
+
+import pandas as pd
+import streamlit as st
+
+from churn import perf
+from churn.figures import figure_cache
+from churn.perf import span
+from churn.prediction_cache import prediction_cache
+
+
+def render_tabs(labels, renders, key, lazy=True):
+    """Show one tab per label, calling renders[i]() for the content of tab i.
+
+    st.tabs runs the content of every tab on each rerun even though only one
+    is visible. In lazy mode the tab bar is a horizontal radio and only the
+    selected tab is rendered, so page time follows what is on screen.
+    """
+    with span(f'section/{key}'):
+        if lazy:
+            selected = st.radio(key, labels, horizontal=True, key=f"tabs-{key}", label_visibility='collapsed')
+            renders[labels.index(selected)]()
+        else:
+            for tab, render in zip(st.tabs(labels), renders):
+                with tab:
+                    render()
+
+
+def show_figure(key, render, locations, data_version):
+    # Rendered once per location filter and dataset, later reruns reuse the PNG
+    png = figure_cache.get(key + (tuple(locations), data_version), render)
+    st.image(png, use_column_width=True)
+
+
+def render_sections(sections, cube, correlations, locations, data_version, lazy=True):
+    """Subheader, caption and figure tabs of every section."""
+    for section in sections:
+        st.subheader(section.title)
+        st.caption(section.caption)
+        renders = [
+            lambda key=key, render=render: show_figure(key, render, locations, data_version)
+            for key, render in section.figures(cube, correlations, locations)
+        ]
+        render_tabs(section.tab_labels, renders, key=section.feature, lazy=lazy)
+
+
+def session_recorder():
+    """Span recorder of this browser session, bound to the script thread."""
+    recorder = st.session_state.get('perf_recorder')
+    if recorder is None:
+        recorder = st.session_state['perf_recorder'] = perf.Recorder()
+    perf.bind(recorder)
+    return recorder
+
+
+def performance_panel(recorder, run_started):
+    """Optional sidebar panel with the spans of this session or of the process."""
+    perf.record('script/run', time.perf_counter() - run_started)
+    with st.sidebar:
+        if not st.toggle("Performance panel", value=False, key='perf-panel'):
+            return
+        scope = st.radio("Spans of", ["This session", "All sessions"], horizontal=True, key='perf-scope')
+        shown = recorder if scope == "This session" else perf.process_recorder
+
+        rows = pd.DataFrame(shown.snapshot(), columns=['span', 'count', 'total_s', 'mean_s', 'max_s', 'last_s'])
+        for column in ['total', 'mean', 'max', 'last']:
+            rows[f'{column} ms'] = (rows.pop(f'{column}_s') * 1000).round(1)
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+
+        cache = prediction_cache.stats()
+        st.caption(f"Prediction cache: {cache['hits']:,} hits, {cache['misses']:,} misses "
+                   f"({cache['hit_rate']:.0%} hit rate), {cache['size']:,} of {cache['maxsize']:,} entries")
+
+        st.download_button("Export JSON", shown.to_json(), file_name='churn-spans.json', mime='application/json')
+        st.download_button("Export Prometheus", shown.to_prometheus(), file_name='churn-spans.prom', mime='text/plain')
+        if scope == "This session" and st.button("Reset session spans"):
+            recorder.reset()
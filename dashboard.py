@@ -1,22 +1,30 @@
 # Start Library
-import os
 import sys
-import joblib
-import numpy as np
+import time
 import pandas as pd
-import seaborn as sns
 import streamlit as st
-import matplotlib.pyplot as plt
-from scipy.stats import shapiro, probplot
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score, roc_curve, auc, classification_report
+from churn.charts import churn_countplot, churn_pie, report_heatmap, score_curves
+from churn.correlation import correlation_engine
+from churn.crosstab import churn_cube
+from churn.data import DECDF_PATH, load_decdf, source_version
+from churn.encoding import feature_encoder
+from churn.evaluation import DEFAULT_THRESHOLD, ScoreCurve, load_report, report_path
+from churn.locations import location_index
+from churn.perf import span
+from churn.prediction_cache import prediction_cache
+from churn.registry import get_model_entry
+from churn.sections import sections
+from churn.ui import performance_panel, render_sections, session_recorder, show_figure
 # End Library
 
-dirloc = os.path.dirname(os.path.abspath(__file__))
-heatdf = pd.read_excel(dirloc + "/dataset/heat.xlsx", index_col=0)
-decdf = pd.read_excel(dirloc + "/dataset/decdf.xlsx")
+# Spans of this session for the Performance panel
+perf_recorder = session_recorder()
+run_started = time.perf_counter()
+
+# Served from the Parquet cache next to the xlsx sources
+decdf = load_decdf()
+# Rows of every location, found once per dataset
+locations = location_index(decdf)
 
 with st.sidebar:
     # Title
@@ -24,926 +32,100 @@ with st.sidebar:
     # Using st.form to wrap checkboxes
     with st.form(key='location_form'):
         st.subheader("Choose Location")
-        jakarta_selected = st.checkbox("Jakarta", value=True)
-        bandung_selected = st.checkbox("Bandung", value=True)
+        location_selected = {code: st.checkbox(locations.name(code), value=True, key=f"location-{code}")
+                             for code in locations.codes}
 
         # Submit button to reload the page
         apply_button = st.form_submit_button(label='Apply')
 
     # Check if at least one checkbox is selected
-    if not jakarta_selected and not bandung_selected:
+    if not any(location_selected.values()):
         st.warning("Please select at least one location.")
+    # st.tabs draws every tab on each rerun, lazy mode only draws the open one
+    lazy_tabs = st.toggle("Render only the open tab", value=True)
     st.subheader("Jump to Analysis Result Section")
-    st.markdown("[Call Center](#call-center-comparison)")
-    st.markdown("[Games Product](#games-product-uses-comparison)")
-    st.markdown("[Music Product](#music-product-uses-comparison)")
-    st.markdown("[Education Product](#education-product-uses-comparison)")
-    st.markdown("[Use MyApp](#use-myapp-uses-comparison)")
-    st.markdown("[Video Product](#video-product-uses-comparison)")
-    st.markdown("[Payment Method](#payment-method-comparison)")
+    for section in sections:
+        st.markdown(f"[{section.feature}](#{section.anchor})")
     st.markdown("[Classification Report](#classification-random-forest-report)")
     st.markdown("[Predict Data](#input-for-prediction)")
 
-
-if not (jakarta_selected or bandung_selected):
+if not any(location_selected.values()):
     st.error("Please select at least one location.")
     sys.exit()
 
-# Filter data based on selected locations
-if jakarta_selected and bandung_selected:
-    filtered_decdf = decdf
-elif jakarta_selected:
-    filtered_decdf = decdf[decdf['Location'] == 0]
-elif bandung_selected:
-    filtered_decdf = decdf[decdf['Location'] == 1]
-else:
-    filtered_decdf = pd.DataFrame()
+# Location codes of the selected locations
+selected_locations = [code for code, selected in location_selected.items() if selected]
+
+# Churn counts for every chart below, computed once per dataset
+crosstab = churn_cube(decdf)
+# One-hot correlation statistics per location, updated when rows are appended
+correlations = correlation_engine(decdf)
+decdf_version = source_version(DECDF_PATH)
 
 st.title("Classification Model using Random Forest Algoritm to Predict Customer Decision by Customer Behavior")
 
 # Header
 st.header("Differential Of Churn")
-# Filter data based on selected locations
-if jakarta_selected and bandung_selected:
-    st.subheader("Location: Jakarta and Bandung")
-elif jakarta_selected:
-    st.subheader("Location: Jakarta")
-elif bandung_selected:
-    st.subheader("Location: Bandung")
-
-sizes = [len(filtered_decdf[filtered_decdf['Churn Label'] == 0]), len(filtered_decdf[filtered_decdf['Churn Label'] == 1])]
-        
-# Check for zero or negative values in sizes
-if any(size <= 0 for size in sizes):
-            raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-        
-labels = 'Loyal Client', 'Client Left'
-explode = (0.1, 0.2)
-
-fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-        
-wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%', 
-                                   explode=explode, shadow=True, startangle=85,
-                                   pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
+st.subheader(f"Location: {locations.describe(selected_locations)}")
 
-ax_tes.axis('equal')
+# Xticks Label
+var = [locations.name(code) for code in selected_locations]
 
-ax_tes.legend(loc='best', labels=labels)
-
-st.pyplot(fig)
-
-plt.clf()
+show_figure(('Churn', 'Pie'), lambda: churn_pie(crosstab.churn_counts(locations=selected_locations)), selected_locations, decdf_version)
 
 # Count Plot
-ax = sns.countplot(x='Location', hue='Churn Label', data=filtered_decdf)
-
-label = {'No Churn', 'Churn'}
-
-# Notation
-for i, p in enumerate(ax.patches):
-    if i < len(ax.patches)-len(label):
-        ax.annotate(f'{p.get_height()}', (p.get_x() + p.get_width() / 2., p.get_height() / 100 + 50),
-                ha='center', fontsize=7, color='white')
-
-# Xticks Label 
-# Filter data based on selected locations
-if jakarta_selected and bandung_selected:
-    var = ['Jakarta', 'Bandung']
-elif jakarta_selected:
-    var = ['Jakarta']
-elif bandung_selected:
-    var = ['Bandung']
-ax.set_xticklabels(var)
-
-# Label
-plt.xlabel('Location')
-plt.ylabel('Jumlah Pengguna')
-plt.title('Count Plot Location vs Churn Label')
-
-# Legend
-ax.legend(title='Churn Label', labels=label, loc='best')
-
-st.pyplot(plt)
-
-plt.clf()
+show_figure(('Location', 'Count Plot'), lambda: churn_countplot(crosstab.counts('Location', selected_locations), 'Location', var,
+                                                                ylabel='Jumlah Pengguna', title='Count Plot Location vs Churn Label', fontsize=7),
+            selected_locations, decdf_version)
 
 st.header("Analysis Result")
-st.subheader("Call Center Comparison")
-st.caption("It can be seen from the display data, that the service of the call center is not the cause of customers leaving the company, even when customers use call center services, it can reduce the number of customers leaving the company.")
-
-tab1, tab2, tab3, tab4 = st.tabs(["[Comparison]", "[Does Not Use Call Center]", "[Use Call Center]", "[Correlation]"])
-with tab1:
-    # Count Plot
-    ax = sns.countplot(x='Call Center', hue='Churn Label', data=filtered_decdf )
-
-    label = ['No Churn', 'Churn']
-
-    # Notation
-    for i, p in enumerate(ax.patches):
-            if i < len(ax.patches)-len(label):
-                ax.annotate(f'{p.get_height()}', (p.get_x() + p.get_width() / 2., p.get_height() / 100 + 50),
-                        ha='center', fontsize=8, color='white')
-
-    # Xticks Label 
-    var = ['No', 'Yes']
-    ax.set_xticks(range(len(var)))
-    ax.set_xticklabels(var)
-
-    # Label
-    plt.xlabel('Call Center')
-    plt.ylabel('Count')
-
-    # Legend
-    ax.legend(title='Churn Label', labels=label, loc='best')
-
-    st.pyplot(plt)
-
-    plt.clf()
-
-with tab2:
-    sizes = [len(filtered_decdf[(filtered_decdf['Churn Label'] == 0) & (filtered_decdf['Call Center'] == 0)]),
-             len(filtered_decdf[(filtered_decdf['Churn Label'] == 1) & (filtered_decdf['Call Center'] == 0)])]
-
-    # Check for zero or negative values in sizes
-    if any(size <= 0 for size in sizes):
-                raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-
-    labels = 'Loyal Client', 'Client Left'
-      
-    explode = (0.1, 0.2)
-
-    fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-
-  
-
-    wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%',   
-                                       explode=explode, shadow=True, startangle=85,
-                                       pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
-
-    ax_tes.axis('equal')
-
-    ax_tes.legend(loc='best', labels=labels)
-
-    st.pyplot(fig)
-
-    plt.clf()
-
-with tab3:
-    sizes = [len(filtered_decdf[(filtered_decdf['Churn Label'] == 0) & (filtered_decdf['Call Center'] == 1)]),
-             len(filtered_decdf[(filtered_decdf['Churn Label'] == 1) & (filtered_decdf['Call Center'] == 1)])]
-
-    # Check for zero or negative values in sizes
-    if any(size <= 0 for size in sizes):
-                raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-
-    labels = 'Loyal Client', 'Client Left'
-      
-    explode = (0.1, 0.2)
-
-    fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-
-  
-
-    wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%',   
-                                       explode=explode, shadow=True, startangle=85,
-                                       pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
-
-    ax_tes.axis('equal')
-
-    ax_tes.legend(loc='best', labels=labels)
-
-    st.pyplot(fig)
-
-    plt.clf()
-
-with tab4:
-    plt.figure(figsize=(12, 8))
-    heatmap = sns.heatmap(heatdf.loc[['Call Center_No', 'Call Center_Yes', 'Churn Label_No', 'Churn Label_Yes'], ['Call Center_No', 'Call Center_Yes', 'Churn Label_No', 'Churn Label_Yes']], cmap='coolwarm', linewidths=.5, annot=True, fmt=".2f")
-
-    # Miringkan label sumbu x
-    plt.xticks(rotation=45, ha='right')
-    plt.yticks(rotation=0)
-
-    st.pyplot(plt)
-
-    plt.clf()
-
-st.subheader("Games Product Uses Comparison")
-st.caption("It can be seen from the display data, that customers who use internet services on games product tend to have a significantly higher level of loyalty to the company than customers who do not use it as internet services on games product, so it can be estimated that customers are very satisfied with internet services in the use of games product.")
-
-tab1, tab2, tab3, tab4 = st.tabs(["[Comparison]", "[Does Not Use Games Product]", "[Use Games Product]", "[Correlation]"])
-with tab1:
-    # Count Plot
-    ax = sns.countplot(x='Games Product', hue='Churn Label', data=filtered_decdf )
-
-    label = ['No Churn', 'Churn']
-
-    # Notation
-    for i, p in enumerate(ax.patches):
-            if i < len(ax.patches)-len(label):
-                ax.annotate(f'{p.get_height()}', (p.get_x() + p.get_width() / 2., p.get_height() / 100 + 50),
-                        ha='center', fontsize=8, color='white')
-
-    # Xticks Label 
-    var = ['No', 'Yes', 'No internet service']
-    ax.set_xticks(range(len(var)))
-    ax.set_xticklabels(var)
-
-    # Label
-    plt.xlabel('Games Product')
-    plt.ylabel('Count')
-
-    # Legend
-    ax.legend(title='Churn Label', labels=label, loc='best')
-
-    st.pyplot(plt)
-
-    plt.clf()
-
-with tab2:
-    sizes = [len(filtered_decdf[(filtered_decdf['Churn Label'] == 0) & (filtered_decdf['Games Product'] == 0)]),
-             len(filtered_decdf[(filtered_decdf['Churn Label'] == 1) & (filtered_decdf['Games Product'] == 0)])]
-
-    # Check for zero or negative values in sizes
-    if any(size <= 0 for size in sizes):
-                raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-
-    labels = 'Loyal Client', 'Client Left'
-      
-    explode = (0.1, 0.2)
-
-    fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-
-  
-
-    wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%',   
-                                       explode=explode, shadow=True, startangle=85,
-                                       pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
-
-    ax_tes.axis('equal')
-
-    ax_tes.legend(loc='best', labels=labels)
-
-    st.pyplot(fig)
-
-    plt.clf()
-
-with tab3:
-    sizes = [len(filtered_decdf[(filtered_decdf['Churn Label'] == 0) & (filtered_decdf['Games Product'] == 1)]),
-             len(filtered_decdf[(filtered_decdf['Churn Label'] == 1) & (filtered_decdf['Games Product'] == 1)])]
-
-    # Check for zero or negative values in sizes
-    if any(size <= 0 for size in sizes):
-                raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-
-    labels = 'Loyal Client', 'Client Left'
-      
-    explode = (0.1, 0.2)
-
-    fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-
-  
-
-    wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%',   
-                                       explode=explode, shadow=True, startangle=85,
-                                       pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
-
-    ax_tes.axis('equal')
-
-    ax_tes.legend(loc='best', labels=labels)
-
-    st.pyplot(fig)
-
-    plt.clf()
-
-with tab4:
-    plt.figure(figsize=(12, 8))
-    heatmap = sns.heatmap(heatdf.loc[['Games Product_No', 'Games Product_Yes', 'Churn Label_No', 'Churn Label_Yes'], ['Games Product_No', 'Games Product_Yes', 'Churn Label_No', 'Churn Label_Yes']], cmap='coolwarm', linewidths=.5, annot=True, fmt=".2f")
-
-    # Miringkan label sumbu x
-    plt.xticks(rotation=45, ha='right')
-    plt.yticks(rotation=0)
-
-    st.pyplot(plt)
-
-    plt.clf()
-
-st.subheader("Music Product Uses Comparison")
-st.caption("It can be seen from the display data, that customers who use internet services for music products have the most customers, so it can be estimated that for now, customers are quite satisfied with internet services and it can be said that the purpose of customers using internet services at the company is to use the music product.")
-
-tab1, tab2, tab3, tab4 = st.tabs(["[Comparison]", "[Does Not Use Music Product]", "[Use Music Product]", "[Correlation]"])
-with tab1:
-    # Count Plot
-    ax = sns.countplot(x='Music Product', hue='Churn Label', data=filtered_decdf )
-
-    label = ['No Churn', 'Churn']
-
-    # Notation
-    for i, p in enumerate(ax.patches):
-            if i < len(ax.patches)-len(label):
-                ax.annotate(f'{p.get_height()}', (p.get_x() + p.get_width() / 2., p.get_height() / 100 + 50),
-                        ha='center', fontsize=8, color='white')
-
-    # Xticks Label 
-    var = ['No', 'Yes', 'No internet service']
-    ax.set_xticks(range(len(var)))
-    ax.set_xticklabels(var)
-
-    # Label
-    plt.xlabel('Music Product')
-    plt.ylabel('Count')
-
-    # Legend
-    ax.legend(title='Churn Label', labels=label, loc='best')
-
-    st.pyplot(plt)
-
-    plt.clf()
-
-with tab2:
-    sizes = [len(filtered_decdf[(filtered_decdf['Churn Label'] == 0) & (filtered_decdf['Music Product'] == 0)]),
-             len(filtered_decdf[(filtered_decdf['Churn Label'] == 1) & (filtered_decdf['Music Product'] == 0)])]
-
-    # Check for zero or negative values in sizes
-    if any(size <= 0 for size in sizes):
-                raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-
-    labels = 'Loyal Client', 'Client Left'
-      
-    explode = (0.1, 0.2)
-
-    fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-
-  
-
-    wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%',   
-                                       explode=explode, shadow=True, startangle=85,
-                                       pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
-
-    ax_tes.axis('equal')
-
-    ax_tes.legend(loc='best', labels=labels)
-
-    st.pyplot(fig)
-
-    plt.clf()
-
-with tab3:
-    sizes = [len(filtered_decdf[(filtered_decdf['Churn Label'] == 0) & (filtered_decdf['Music Product'] == 1)]),
-             len(filtered_decdf[(filtered_decdf['Churn Label'] == 1) & (filtered_decdf['Music Product'] == 1)])]
-
-    # Check for zero or negative values in sizes
-    if any(size <= 0 for size in sizes):
-                raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-
-    labels = 'Loyal Client', 'Client Left'
-      
-    explode = (0.1, 0.2)
-
-    fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-
-  
-
-    wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%',   
-                                       explode=explode, shadow=True, startangle=85,
-                                       pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
-
-    ax_tes.axis('equal')
-
-    ax_tes.legend(loc='best', labels=labels)
-
-    st.pyplot(fig)
-
-    plt.clf()
-
-with tab4:
-    plt.figure(figsize=(12, 8))
-    heatmap = sns.heatmap(heatdf.loc[['Music Product_No', 'Music Product_Yes', 'Churn Label_No', 'Churn Label_Yes'], ['Music Product_No', 'Music Product_Yes', 'Churn Label_No', 'Churn Label_Yes']], cmap='coolwarm', linewidths=.5, annot=True, fmt=".2f")
-
-    # Miringkan label sumbu x
-    plt.xticks(rotation=45, ha='right')
-    plt.yticks(rotation=0)
-
-    st.pyplot(plt)
-
-    plt.clf()
-
-plt.clf()
-
-st.subheader("Education Product Uses Comparison")
-st.caption("It can be seen from the display data that customers who use internet service for educational products are among those who do not have a significant impact on churn rates.")
-
-tab1, tab2, tab3, tab4 = st.tabs(["[Comparison]", "[Does Not Use Education Product]", "[Use Education Product]", "[Correlation]"])
-with tab1:
-    # Count Plot
-    ax = sns.countplot(x='Education Product', hue='Churn Label', data=filtered_decdf )
-
-    label = ['No Churn', 'Churn']
-
-    # Notation
-    for i, p in enumerate(ax.patches):
-            if i < len(ax.patches)-len(label):
-                ax.annotate(f'{p.get_height()}', (p.get_x() + p.get_width() / 2., p.get_height() / 100 + 50),
-                        ha='center', fontsize=8, color='white')
-
-    # Xticks Label 
-    var = ['No', 'Yes', 'No internet service']
-    ax.set_xticks(range(len(var)))
-    ax.set_xticklabels(var)
-
-    # Label
-    plt.xlabel('Education Product')
-    plt.ylabel('Count')
-
-    # Legend
-    ax.legend(title='Churn Label', labels=label, loc='best')
-
-    st.pyplot(plt)
-
-    plt.clf()
-
-with tab2:
-    sizes = [len(filtered_decdf[(filtered_decdf['Churn Label'] == 0) & (filtered_decdf['Education Product'] == 0)]),
-             len(filtered_decdf[(filtered_decdf['Churn Label'] == 1) & (filtered_decdf['Education Product'] == 0)])]
-
-    # Check for zero or negative values in sizes
-    if any(size <= 0 for size in sizes):
-                raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-
-    labels = 'Loyal Client', 'Client Left'
-      
-    explode = (0.1, 0.2)
-
-    fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-
-  
-
-    wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%',   
-                                       explode=explode, shadow=True, startangle=85,
-                                       pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
-
-    ax_tes.axis('equal')
-
-    ax_tes.legend(loc='best', labels=labels)
-
-    st.pyplot(fig)
-
-    plt.clf()
-
-with tab3:
-    sizes = [len(filtered_decdf[(filtered_decdf['Churn Label'] == 0) & (filtered_decdf['Education Product'] == 1)]),
-             len(filtered_decdf[(filtered_decdf['Churn Label'] == 1) & (filtered_decdf['Education Product'] == 1)])]
-
-    # Check for zero or negative values in sizes
-    if any(size <= 0 for size in sizes):
-                raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-
-    labels = 'Loyal Client', 'Client Left'
-      
-    explode = (0.1, 0.2)
-
-    fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-
-  
-
-    wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%',   
-                                       explode=explode, shadow=True, startangle=85,
-                                       pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
-
-    ax_tes.axis('equal')
+render_sections(sections, crosstab, correlations, selected_locations, decdf_version, lazy=lazy_tabs)
 
-    ax_tes.legend(loc='best', labels=labels)
+# Load the saved model, cached once per process
+model_entry = get_model_entry()
+model = model_entry.model
 
-    st.pyplot(fig)
-
-    plt.clf()
-
-with tab4:
-    plt.figure(figsize=(12, 8))
-    heatmap = sns.heatmap(heatdf.loc[['Education Product_No', 'Education Product_Yes', 'Churn Label_No', 'Churn Label_Yes'], ['Education Product_No', 'Education Product_Yes', 'Churn Label_No', 'Churn Label_Yes']], cmap='coolwarm', linewidths=.5, annot=True, fmt=".2f")
-
-    # Miringkan label sumbu x
-    plt.xticks(rotation=45, ha='right')
-    plt.yticks(rotation=0)
-
-    st.pyplot(plt)
-
-    plt.clf()
-
-st.subheader("Use MyApp Uses Comparison")
-st.caption("It can be seen from the display data, that customers who use internet service for Use MyApp, have the most impact on customers changing internet companies, so it is necessary to improve service to customers.")
-
-tab1, tab2, tab3, tab4 = st.tabs(["[Comparison]", "[Does Not Use MyApp]", "[Use MyApp]", "[Correlation]"])
-with tab1:
-    # Count Plot
-    ax = sns.countplot(x='Use MyApp', hue='Churn Label', data=filtered_decdf )
-
-    label = ['No Churn', 'Churn']
-
-    # Notation
-    for i, p in enumerate(ax.patches):
-            if i < len(ax.patches)-len(label):
-                ax.annotate(f'{p.get_height()}', (p.get_x() + p.get_width() / 2., p.get_height() / 100 + 50),
-                        ha='center', fontsize=8, color='white')
-
-    # Xticks Label 
-    var = ['No', 'Yes', 'No internet service']
-    ax.set_xticks(range(len(var)))
-    ax.set_xticklabels(var)
-
-    # Label
-    plt.xlabel('Use MyApp')
-    plt.ylabel('Count')
-
-    # Legend
-    ax.legend(title='Churn Label', labels=label, loc='best')
-
-    st.pyplot(plt)
-
-    plt.clf()
-
-with tab2:
-    sizes = [len(filtered_decdf[(filtered_decdf['Churn Label'] == 0) & (filtered_decdf['Use MyApp'] == 0)]),
-             len(filtered_decdf[(filtered_decdf['Churn Label'] == 1) & (filtered_decdf['Use MyApp'] == 0)])]
-
-    # Check for zero or negative values in sizes
-    if any(size <= 0 for size in sizes):
-                raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-
-    labels = 'Loyal Client', 'Client Left'
-      
-    explode = (0.1, 0.2)
-
-    fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-
-  
-
-    wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%',   
-                                       explode=explode, shadow=True, startangle=85,
-                                       pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
-
-    ax_tes.axis('equal')
-
-    ax_tes.legend(loc='best', labels=labels)
-
-    st.pyplot(fig)
-
-    plt.clf()
-
-with tab3:
-    sizes = [len(filtered_decdf[(filtered_decdf['Churn Label'] == 0) & (filtered_decdf['Use MyApp'] == 1)]),
-             len(filtered_decdf[(filtered_decdf['Churn Label'] == 1) & (filtered_decdf['Use MyApp'] == 1)])]
-
-    # Check for zero or negative values in sizes
-    if any(size <= 0 for size in sizes):
-                raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-
-    labels = 'Loyal Client', 'Client Left'
-      
-    explode = (0.1, 0.2)
-
-    fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-
-  
-
-    wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%',   
-                                       explode=explode, shadow=True, startangle=85,
-                                       pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
-
-    ax_tes.axis('equal')
-
-    ax_tes.legend(loc='best', labels=labels)
-
-    st.pyplot(fig)
-
-    plt.clf()
-
-with tab4:
-    plt.figure(figsize=(12, 8))
-    heatmap = sns.heatmap(heatdf.loc[['Use MyApp_No', 'Use MyApp_Yes', 'Churn Label_No', 'Churn Label_Yes'], ['Use MyApp_No', 'Use MyApp_Yes', 'Churn Label_No', 'Churn Label_Yes']], cmap='coolwarm', linewidths=.5, annot=True, fmt=".2f")
-
-    # Miringkan label sumbu x
-    plt.xticks(rotation=45, ha='right')
-    plt.yticks(rotation=0)
-
-    st.pyplot(plt)
-
-    plt.clf()
-
-st.subheader("Video Product Uses Comparison")
-st.caption("Just like customers who use myapp, customers who use internet service for video  have a strong impact that can make customers leave the company, so it is necessary to improve the improve connection stream between majority video streaming platform.")
-
-tab1, tab2, tab3, tab4 = st.tabs(["[Comparison]", "[Does Not Use Video Product]", "[Use Video Product]", "[Correlation]"])
-with tab1:
-    # Count Plot
-    ax = sns.countplot(x='Video Product', hue='Churn Label', data=filtered_decdf )
-
-    label = ['No Churn', 'Churn']
-
-    # Notation
-    for i, p in enumerate(ax.patches):
-            if i < len(ax.patches)-len(label):
-                ax.annotate(f'{p.get_height()}', (p.get_x() + p.get_width() / 2., p.get_height() / 100 + 50),
-                        ha='center', fontsize=8, color='white')
-
-    # Xticks Label 
-    var = ['No', 'Yes', 'No internet service']
-    ax.set_xticks(range(len(var)))
-    ax.set_xticklabels(var)
-
-    # Label
-    plt.xlabel('Video Product')
-    plt.ylabel('Count')
-
-    # Legend
-    ax.legend(title='Churn Label', labels=label, loc='best')
-
-    st.pyplot(plt)
-
-    plt.clf()
-
-with tab2:
-    sizes = [len(filtered_decdf[(filtered_decdf['Churn Label'] == 0) & (filtered_decdf['Video Product'] == 0)]),
-             len(filtered_decdf[(filtered_decdf['Churn Label'] == 1) & (filtered_decdf['Video Product'] == 0)])]
-
-    # Check for zero or negative values in sizes
-    if any(size <= 0 for size in sizes):
-                raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-
-    labels = 'Loyal Client', 'Client Left'
-      
-    explode = (0.1, 0.2)
-
-    fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-
-  
-
-    wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%',   
-                                       explode=explode, shadow=True, startangle=85,
-                                       pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
-
-    ax_tes.axis('equal')
-
-    ax_tes.legend(loc='best', labels=labels)
-
-    st.pyplot(fig)
-
-    plt.clf()
-
-with tab3:
-    sizes = [len(filtered_decdf[(filtered_decdf['Churn Label'] == 0) & (filtered_decdf['Video Product'] == 1)]),
-             len(filtered_decdf[(filtered_decdf['Churn Label'] == 1) & (filtered_decdf['Video Product'] == 1)])]
-
-    # Check for zero or negative values in sizes
-    if any(size <= 0 for size in sizes):
-                raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-
-    labels = 'Loyal Client', 'Client Left'
-      
-    explode = (0.1, 0.2)
-
-    fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-
-  
-
-    wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%',   
-                                       explode=explode, shadow=True, startangle=85,
-                                       pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
-
-    ax_tes.axis('equal')
-
-    ax_tes.legend(loc='best', labels=labels)
-
-    st.pyplot(fig)
-
-    plt.clf()
-
-with tab4:
-    plt.figure(figsize=(12, 8))
-    heatmap = sns.heatmap(heatdf.loc[['Video Product_No', 'Video Product_Yes', 'Churn Label_No', 'Churn Label_Yes'], ['Video Product_No', 'Video Product_Yes', 'Churn Label_No', 'Churn Label_Yes']], cmap='coolwarm', linewidths=.5, annot=True, fmt=".2f")
-    plt.title("Grafik Korelasi")
-
-    # Miringkan label sumbu x
-    plt.xticks(rotation=45, ha='right')
-    plt.yticks(rotation=0)
-
-    st.pyplot(plt)
-
-    plt.clf()
-
-st.subheader("Payment Method Comparison")
-st.caption("When viewed from each data, customers with pulsa payment methods have the highest impact on leaving the company.")
-
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["[Comparison]", "[By Digital Wallet]", "[By Pulsa]", "[By Debit]", "[By Credit]", "[Correlation]"])
-with tab1:
-    # Count Plot
-    ax = sns.countplot(x='Payment Method', hue='Churn Label', data=filtered_decdf )
-
-    label = ['No Churn', 'Churn']
-
-    # Notation
-    for i, p in enumerate(ax.patches):
-            if i < len(ax.patches)-len(label):
-                ax.annotate(f'{p.get_height()}', (p.get_x() + p.get_width() / 2., p.get_height() / 100 + 50),
-                        ha='center', fontsize=8, color='white')
-    
-    # Xticks Label 
-    var = ['Digital Wallet', 'Pulsa', 'Debit', 'Credit']
-    ax.set_xticks(range(len(var)))
-    ax.set_xticklabels(var)
-
-    # Label
-    plt.xlabel('Video Product')
-    plt.ylabel('Count')
-
-    # Legend
-    ax.legend(title='Churn Label', labels=label, loc='best')
-
-    st.pyplot(plt)
-
-    plt.clf()
-
-with tab2:
-    sizes = [len(filtered_decdf[(filtered_decdf['Churn Label'] == 0) & (filtered_decdf['Payment Method'] == 0)]),
-             len(filtered_decdf[(filtered_decdf['Churn Label'] == 1) & (filtered_decdf['Payment Method'] == 0)])]
-
-    # Check for zero or negative values in sizes
-    if any(size <= 0 for size in sizes):
-                raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-
-    labels = 'Loyal Client', 'Client Left'
-      
-    explode = (0.1, 0.2)
-
-    fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-
-  
-
-    wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%',   
-                                       explode=explode, shadow=True, startangle=85,
-                                       pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
-
-    ax_tes.axis('equal')
-
-    ax_tes.legend(loc='best', labels=labels)
-
-    st.pyplot(fig)
-
-    plt.clf()
-
-with tab3:
-    sizes = [len(filtered_decdf[(filtered_decdf['Churn Label'] == 0) & (filtered_decdf['Payment Method'] == 1)]),
-             len(filtered_decdf[(filtered_decdf['Churn Label'] == 1) & (filtered_decdf['Payment Method'] == 1)])]
-
-    # Check for zero or negative values in sizes
-    if any(size <= 0 for size in sizes):
-                raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-
-    labels = 'Loyal Client', 'Client Left'
-      
-    explode = (0.1, 0.2)
-
-    fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-
-  
-
-    wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%',   
-                                       explode=explode, shadow=True, startangle=85,
-                                       pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
-
-    ax_tes.axis('equal')
-
-    ax_tes.legend(loc='best', labels=labels)
-
-    st.pyplot(fig)
-
-    plt.clf()
-
-with tab4:
-    sizes = [len(filtered_decdf[(filtered_decdf['Churn Label'] == 0) & (filtered_decdf['Payment Method'] == 2)]),
-             len(filtered_decdf[(filtered_decdf['Churn Label'] == 1) & (filtered_decdf['Payment Method'] == 2)])]
-
-    # Check for zero or negative values in sizes
-    if any(size <= 0 for size in sizes):
-                raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-
-    labels = 'Loyal Client', 'Client Left'
-      
-    explode = (0.1, 0.2)
-
-    fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-
-  
-
-    wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%',   
-                                       explode=explode, shadow=True, startangle=85,
-                                       pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
-
-    ax_tes.axis('equal')
-
-    ax_tes.legend(loc='best', labels=labels)
-
-    st.pyplot(fig)
-
-    plt.clf()
-
-with tab5:
-    sizes = [len(filtered_decdf[(filtered_decdf['Churn Label'] == 0) & (filtered_decdf['Payment Method'] == 3)]),
-             len(filtered_decdf[(filtered_decdf['Churn Label'] == 1) & (filtered_decdf['Payment Method'] == 3)])]
-
-    # Check for zero or negative values in sizes
-    if any(size <= 0 for size in sizes):
-                raise ValueError("Invalid sizes: sizes should be positive and non-zero.")
-
-    labels = 'Loyal Client', 'Client Left'
-      
-    explode = (0.1, 0.2)
-
-    fig, ax_tes = plt.subplots()  # Use a different variable name for the axis
-
-  
-
-    wedges, texts, autotexts = ax_tes.pie(sizes, autopct='%1.1f%%',   
-                                       explode=explode, shadow=True, startangle=85,
-                                       pctdistance=0.85, wedgeprops={'width': 1}, textprops={'color': 'white'})
-
-    ax_tes.axis('equal')
-
-    ax_tes.legend(loc='best', labels=labels)
-
-    st.pyplot(fig)
-
-    plt.clf()
-
-with tab6:
-    plt.figure(figsize=(12, 8))
-    heatmap = sns.heatmap(heatdf.loc[['Payment Method_Digital Wallet', 'Payment Method_Pulsa', 'Payment Method_Debit', 'Payment Method_Credit', 'Churn Label_No', 'Churn Label_Yes'], ['Payment Method_Digital Wallet', 'Payment Method_Pulsa', 'Payment Method_Debit', 'Payment Method_Credit', 'Churn Label_No', 'Churn Label_Yes']], cmap='coolwarm', linewidths=.5, annot=True, fmt=".2f")
-
-    # Miringkan label sumbu x
-    plt.xticks(rotation=45, ha='right')
-    plt.yticks(rotation=0)
-
-    st.pyplot(plt)
-
-    plt.clf()
-
-nama_feature = ['Tenure Months', 'Device Class',
-                'Games Product', 'Music Product',
-                'Education Product', 'Use MyApp',
-                'Video Product', 'Monthly Purchase (Thou. IDR)',
-                'Call Center', 'CLTV (Predicted Thou. IDR)', 'Payment Method']
-
-X = decdf[nama_feature].values
-y = decdf['Churn Label'].values
-
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
-
-# Load the saved model
-model = joblib.load('random_forest_model.joblib')
-
-y_train_pred = model.predict(X_train)
-y_test_pred = model.predict(X_test)
-
-# Metrik evaluasi untuk data latih
-accuracy_train = accuracy_score(y_train, y_train_pred)
-f1_train = f1_score(y_train, y_train_pred)
-precision_train = precision_score(y_train, y_train_pred)
-recall_train = recall_score(y_train, y_train_pred)
-roc_auc_train = roc_auc_score(y_train, y_train_pred)
-
-# Metrik evaluasi untuk data tes
-accuracy_test = accuracy_score(y_test, y_test_pred)
-f1_test = f1_score(y_test, y_test_pred)
-precision_test = precision_score(y_test, y_test_pred)
-recall_test = recall_score(y_test, y_test_pred)
-roc_auc_test = roc_auc_score(y_test, y_test_pred)
-
-# Classification report untuk data tes
-classification_report_test = classification_report(y_test, y_test_pred)
-report = classification_report(y_test, y_test_pred, output_dict=True)
+# Metrics are computed once per model and dataset and stored next to the model
+evaluation = load_report(model, decdf, model_entry.sha256, decdf_version, report_path(model_entry.path))
+train_metrics = evaluation['train']
+test_metrics = evaluation['test']
 
 # Convert report to dataframe
-df_classification_report = pd.DataFrame(report).transpose()
+df_classification_report = pd.DataFrame(evaluation['classification_report']).transpose()
 
 # Plot heatmap
 st.header("Classification Random Forest Report")
-plt.figure(figsize=(10, 5))
-sns.heatmap(df_classification_report.iloc[:-1, :].T, annot=True, cmap="Blues")
-st.pyplot(plt)
+st.caption(f"Model {model_entry.sha256[:12]} loaded in {model_entry.load_seconds * 1000:.0f} ms, {model_entry.nbytes / 2**20:.1f} MB in memory")
+show_figure(('Classification Report', 'Heatmap'), lambda: report_heatmap(df_classification_report), selected_locations, (decdf_version, model_entry.sha256))
 
 st.text("Data Train:")
-st.caption(f"Train Accuracy: {accuracy_train:.2f}")
-st.caption(f"Train F1 Score: {f1_train:.2f}")
-st.caption(f"Train Precision: {precision_train:.2f}")
-st.caption(f"Train Recall: {recall_train:.2f}")
-st.caption(f"Train ROC AUC: {roc_auc_train:.2f}")
+st.caption(f"Train Accuracy: {train_metrics['accuracy']:.2f}")
+st.caption(f"Train F1 Score: {train_metrics['f1']:.2f}")
+st.caption(f"Train Precision: {train_metrics['precision']:.2f}")
+st.caption(f"Train Recall: {train_metrics['recall']:.2f}")
+st.caption(f"Train ROC AUC: {train_metrics['roc_auc']:.2f}")
+st.caption(f"Train Average Precision: {train_metrics['average_precision']:.2f}")
 
 st.text("\nData Test:")
-st.caption(f"Test Accuracy: {accuracy_test:.2f}")
-st.caption(f"Test F1 Score: {f1_test:.2f}")
-st.caption(f"Test Precision: {precision_test:.2f}")
-st.caption(f"Test Recall: {recall_test:.2f}")
-st.caption(f"Test ROC AUC: {roc_auc_test:.2f}")
+st.caption(f"Test Accuracy: {test_metrics['accuracy']:.2f}")
+st.caption(f"Test F1 Score: {test_metrics['f1']:.2f}")
+st.caption(f"Test Precision: {test_metrics['precision']:.2f}")
+st.caption(f"Test Recall: {test_metrics['recall']:.2f}")
+st.caption(f"Test ROC AUC: {test_metrics['roc_auc']:.2f}")
+st.caption(f"Test Average Precision: {test_metrics['average_precision']:.2f}")
+
+# Curves and confusion matrix come from the stored test scores, no model call
+st.subheader("Decision Threshold")
+test_curve = ScoreCurve.from_dict(evaluation['test_curve'])
+show_figure(('Classification Report', 'Curves'), lambda: score_curves(test_curve), selected_locations, (decdf_version, model_entry.sha256))
+
+threshold = st.slider("Predict churn when the churn probability is above", 0.0, 1.0, DEFAULT_THRESHOLD, 0.01)
+(tn, fp), (fn, tp) = test_curve.confusion(threshold)
+st.dataframe(pd.DataFrame([[tn, fp], [fn, tp]],
+                          index=['Actual No Churn', 'Actual Churn'],
+                          columns=['Predicted No Churn', 'Predicted Churn']))
+st.caption(f"Test Precision at {threshold:.2f}: {tp / max(tp + fp, 1):.2f}")
+st.caption(f"Test Recall at {threshold:.2f}: {tp / max(tp + fn, 1):.2f}")
 
 st.header("Input for Prediction")
 
@@ -951,16 +133,16 @@ with st.form(key='my_form'):
     # st.subheader("Input Data Manual")
     # Add input fields for each feature
     tenure_months = st.number_input("Tenure Months", min_value=0, step=1, value=1)
-    device_class = st.selectbox("Device Class", ['Low', 'Medium', 'High'], index=0)
-    games_product = st.selectbox("Games Product", ['No', 'Yes', 'No internet service'], index=0)
-    music_product = st.selectbox("Music Product", ['No', 'Yes', 'No internet service'], index=0)
-    education_product = st.selectbox("Education Product", ['No', 'Yes', 'No internet service'], index=0)
-    use_myapp = st.selectbox("Use MyApp", ['No', 'Yes', 'No internet service'], index=0)
-    video_product = st.selectbox("Video Product", ['No', 'Yes', 'No internet service'], index=0)
+    device_class = st.selectbox("Device Class", feature_encoder.categories['Device Class'], index=0)
+    games_product = st.selectbox("Games Product", feature_encoder.categories['Games Product'], index=0)
+    music_product = st.selectbox("Music Product", feature_encoder.categories['Music Product'], index=0)
+    education_product = st.selectbox("Education Product", feature_encoder.categories['Education Product'], index=0)
+    use_myapp = st.selectbox("Use MyApp", feature_encoder.categories['Use MyApp'], index=0)
+    video_product = st.selectbox("Video Product", feature_encoder.categories['Video Product'], index=0)
     monthly_purchase = st.number_input("Monthly Purchase", min_value=0, step=1, value=1)
-    call_center = st.selectbox("Call Center", ['No', 'Yes'], index=0)
+    call_center = st.selectbox("Call Center", feature_encoder.categories['Call Center'], index=0)
     CLTV = st.number_input("CLTV (Predicted Thou. IDR)", min_value=0, step=1, value=1)
-    payment_method = st.selectbox("Payment Method", ['Digital Wallet', 'Pulsa', 'Debit', 'Credit'], index=0)
+    payment_method = st.selectbox("Payment Method", feature_encoder.categories['Payment Method'], index=0)
     # st.text("")
     # st.subheader("Or Upload Your Excel File")
     # st.markdown("[Template for Excel](https://github.com/KeyCode17/DSW2023-Data_Sayens/raw/main/prediction_template.xlsx)")
@@ -972,63 +154,6 @@ with st.form(key='my_form'):
 
 # Only execute the following code if the form is submitted
 if submitted:
-    # if uploaded_file is not None:
-    #     # Load the Excel file into a DataFrame
-    #     batch_data = pd.read_excel(uploaded_file)
-
-    #     # Process each row in the DataFrame
-    #     predictions = []  # Move this line outside the for loop
-    #     for index, row in batch_data.iterrows():
-    #         try:
-    #             user_input = [
-    #                 row['Tenure Months'],
-    #                 row['Device Class'],
-    #                 row['Games Product'],
-    #                 row['Music Product'],
-    #                 row['Education Product'],
-    #                 row['Use MyApp'],
-    #                 row['Video Product'],
-    #                 row['Monthly Purchase (Thou. IDR)'],
-    #                 row['Call Center'],
-    #                 row['CLTV (Predicted Thou. IDR)'],
-    #                 row['Payment Method']
-    #             ]
-
-    #             # Convert categorical features to numerical values
-    #             device_class_mapping = {'Low': 0, 'Medium': 1, 'High': 2}
-    #             games_product_mapping = {'No': 0, 'Yes': 1, 'No internet service': 3}
-    #             music_product_mapping = {'No': 0, 'Yes': 1, 'No internet service': 3}
-    #             education_product_mapping = {'No': 0, 'Yes': 1, 'No internet service': 3}
-    #             use_myapp_mapping = {'No': 0, 'Yes': 1, 'No internet service': 3}
-    #             video_product_mapping = {'No': 0, 'Yes': 1, 'No internet service': 3}
-    #             call_center_mapping = {'No': 0, 'Yes': 1}
-    #             payment_method_mapping = {"Digital Wallet": 0, "Pulsa": 1, "Debit": 2, "Credit": 3}
-
-    #             # Convert categorical features to numerical values
-    #             user_input[1] = device_class_mapping[user_input[1]]
-    #             user_input[2] = games_product_mapping[user_input[2]]
-    #             user_input[3] = music_product_mapping[user_input[3]]
-    #             user_input[4] = education_product_mapping[user_input[4]]
-    #             user_input[5] = use_myapp_mapping[user_input[5]]
-    #             user_input[6] = video_product_mapping[user_input[6]]
-    #             user_input[8] = call_center_mapping[user_input[8]]
-    #             user_input[10] = payment_method_mapping[user_input[10]]
-
-    #             # Make prediction
-    #             prediction = model.predict([user_input])[0]
-    #             if prediction == 0:
-    #                 predictions.append("No Churn")
-    #             else:
-    #                 predictions.append("Churn")
-    #         except KeyError as e:
-    #             st.error(f"Error processing row {index + 2}: {e}. Make sure all columns are correct.")
-    #             sys.exit()
-
-    #     # Move the block below outside the for loop
-    #     batch_data.insert(0, 'Prediction Result', predictions)
-    #     st.header("Batch Prediction Result")
-    #     st.dataframe(batch_data)
-    # else:
     user_input = [
         tenure_months,
         device_class,
@@ -1043,28 +168,13 @@ if submitted:
         payment_method
     ]
 
-    # Convert categorical features to numerical values
-    device_class_mapping = {'Low': 0, 'Medium': 1, 'High': 2}
-    games_product_mapping = {'No': 0, 'Yes': 1, 'No internet service': 3}
-    music_product_mapping = {'No': 0, 'Yes': 1, 'No internet service': 3}
-    education_product_mapping = {'No': 0, 'Yes': 1, 'No internet service': 3}
-    use_myapp_mapping = {'No': 0, 'Yes': 1, 'No internet service': 3}
-    video_product_mapping = {'No': 0, 'Yes': 1, 'No internet service': 3}
-    call_center_mapping = {'No': 0, 'Yes': 1}
-    payment_method_mapping = {"Digital Wallet": 0, "Pulsa": 1, "Debit": 2, "Credit":3}
-
-    # Convert categorical features to numerical values
-    user_input[1] = device_class_mapping[user_input[1]]
-    user_input[2] = games_product_mapping[user_input[2]]
-    user_input[3] = music_product_mapping[user_input[3]]
-    user_input[4] = education_product_mapping[user_input[4]]
-    user_input[5] = use_myapp_mapping[user_input[5]]
-    user_input[6] = video_product_mapping[user_input[6]]
-    user_input[8] = call_center_mapping[user_input[8]]
-    user_input[10] = payment_method_mapping[user_input[10]]
+    # Encode the categorical features with the shared feature encoder
+    X_input = feature_encoder.transform(user_input)
 
     # Make prediction
-    prediction = model.predict([user_input])[0]
+    with span('predict/form'):
+        proba = prediction_cache.predict_proba(model, model_entry.sha256, X_input)
+        prediction = model.classes_[proba[0].argmax()]
 
     st.header("Prediction Result")
     if prediction == 0:
@@ -1073,3 +183,5 @@ if submitted:
         st.error("The model predicts 'Churn'.")
     # else:
     #     st.error("BLANK HERE SOMETHING WRONG WITH YOUR DATA")
+
+performance_panel(perf_recorder, run_started)